@@ -2,18 +2,38 @@
 
 from __future__ import annotations
 
+import json
 import logging
 import os
+import time
 from uuid import uuid4
 
-from flask import Flask, jsonify, render_template, request, session
-
-from src.chat_engine import ChatEngine
-from src.config import MAX_CONVERSATION_TURNS
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    render_template,
+    request,
+    session,
+    stream_with_context,
+)
+
+from src import metrics
+from src.chat_engine import get_pipeline, preload
+from src.config import MAX_CONVERSATION_TURNS, PREFORK_SERVER
+from src.session_state import SessionState
+from src.session_store import create_session_store
 
 logger = logging.getLogger(__name__)
 
 
+def _sse(event: str, payload: dict) -> str:
+    """Format a server-sent event."""
+
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
 def create_app() -> Flask:
 
     app = Flask(
@@ -25,25 +45,70 @@ def create_app() -> Flask:
     app.config["SECRET_KEY"] = os.environ.get(
         "CHATBOT_SECRET_KEY", "local-dev-secret")
 
-    # Store chat engines per user session to keep conversations isolated.
-    session_engines: dict[str, ChatEngine] = {}
-
-    def _get_engine() -> ChatEngine:
-        """Retrieve or create a ChatEngine bound to the user's session."""
+    # One shared pipeline; each user session only keeps a small state object.
+    # The store is bounded (LRU + idle expiry) and may be shared on disk.
+    # Built before the first request; a pre-fork master also freezes it so
+    # workers keep sharing its memory.
+    preload(freeze=PREFORK_SERVER)
+    pipeline = get_pipeline()
+    session_states = create_session_store()
+    app.extensions["session_store"] = session_states
+    metrics.ACTIVE_SESSIONS.set_function(lambda: len(session_states))
+
+    def _start_background() -> None:
+        # Check Ollama in the background; until it is up, only replies that
+        # need no model (safety fallbacks) are served
+        pipeline.model.health.start()
+        # Load the model and keep it resident while anyone is chatting
+        pipeline.model.warmer.is_active = lambda: len(session_states) > 0
+        pipeline.model.warmer.start()
+
+    # Threads do not survive fork, so a pre-fork master leaves them to workers
+    if PREFORK_SERVER:
+        os.register_at_fork(after_in_child=_start_background)
+    else:
+        _start_background()
+
+    @app.before_request
+    def _start_timer() -> None:
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response: Response) -> Response:
+        """Count the request and its latency under the matched route pattern."""
+
+        # Unmatched paths share one label to keep cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        if route != "/metrics":
+            metrics.HTTP_REQUESTS.inc(
+                route=route, method=request.method, status=response.status_code)
+            metrics.HTTP_LATENCY.observe(
+                time.perf_counter() - g.request_start, route=route)
+        return response
+
+    def _get_state() -> SessionState:
+        """Retrieve or create the conversation state bound to the user's session."""
 
         session_id = session.get("chat_session_id")
-        if not session_id or session_id not in session_engines:
+        state = session_states.get(session_id) if session_id else None
+        if state is None:
             session_id = str(uuid4())
             session["chat_session_id"] = session_id
-            session_engines[session_id] = ChatEngine()
-            logger.info("Created new ChatEngine for session %s", session_id)
-        return session_engines[session_id]
+            state = SessionState(session_id)
+            session_states.put(session_id, state)
+            logger.info("Created new session %s", session_id)
+        return state
+
+    def _save_state(state: SessionState) -> None:
+        """Write the state back so persistent stores see the new turn."""
+
+        session_states.put(state.session_id, state)
 
-    def _drop_engine() -> None:
+    def _drop_state() -> None:
         session_id = session.pop("chat_session_id", None)
-        if session_id and session_id in session_engines:
-            logger.info("Resetting ChatEngine for session %s", session_id)
-            session_engines.pop(session_id, None)
+        if session_id:
+            logger.info("Resetting session %s", session_id)
+            session_states.delete(session_id)
 
     @app.route("/")
     def index() -> str:
@@ -55,8 +120,8 @@ def create_app() -> Flask:
     def session_info():
         """Provide session bootstrap information such as the disclaimer text."""
 
-        engine = _get_engine()
-        disclaimer = engine.moderator.get_disclaimer()
+        _get_state()
+        disclaimer = pipeline.moderator.get_disclaimer()
         return jsonify(
             {
                 "disclaimer": disclaimer.strip(),
@@ -75,10 +140,11 @@ def create_app() -> Flask:
         if not message:
             return jsonify({"error": "Message cannot be empty."}), 400
 
-        engine = _get_engine()
+        state = _get_state()
 
         try:
-            result = engine.process_message(
+            result = pipeline.process_message(
+                state,
                 user_input=message,
                 include_context=include_context,
             )
@@ -94,13 +160,74 @@ def create_app() -> Flask:
                 500,
             )
 
+        _save_state(state)
         return jsonify(result)
 
+    @app.post("/api/message/stream")
+    def stream_message():
+        """Handle a user message, streaming the reply as server-sent events.
+
+        Emits ``token`` events with incremental text, then a single ``done``
+        event carrying the same payload as ``/api/message``. The ``done``
+        response is authoritative and replaces the streamed text, e.g. when
+        output moderation swaps in a fallback.
+        """
+
+        data = request.get_json(silent=True) or {}
+        message = (data.get("message") or "").strip()
+        include_context = bool(data.get("include_context", True))
+
+        if not message:
+            return jsonify({"error": "Message cannot be empty."}), 400
+
+        state = _get_state()
+
+        def generate():
+            try:
+                for event in pipeline.process_message_stream(
+                    state,
+                    user_input=message,
+                    include_context=include_context,
+                ):
+                    if event["type"] == "token":
+                        yield _sse("token", {"text": event["text"]})
+                    else:
+                        _save_state(state)
+                        yield _sse("done", event["result"])
+            except Exception as exc:  # pragma: no cover - defensive logging
+                logger.exception("Chat engine failed to stream message")
+                yield _sse(
+                    "error",
+                    {
+                        "error": "An unexpected error occurred. Please try again or restart the session.",
+                        "details": str(exc),
+                    },
+                )
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.get("/api/health")
+    def health():
+        """Report the cached model availability from the health monitor."""
+
+        status = pipeline.model.health.status()
+        return jsonify(status), 200 if status["ready"] else 503
+
+    @app.get("/metrics")
+    def metrics_endpoint():
+        """Expose operational metrics in the Prometheus text format."""
+
+        return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
     @app.post("/api/reset")
     def reset_session():
         """Reset the conversation for the current user."""
 
-        _drop_engine()
+        _drop_state()
         return jsonify({"success": True})
 
     return app
@@ -392,6 +392,60 @@
       }
     }
 
+    function toSafetyAction(action) {
+      return action === "safe_fallback" ? "fallback" : action;
+    }
+
+    function updateMessage(entry) {
+      const previous = entry.element;
+      const next = renderMessage(entry);
+      if (previous && previous.parentNode) {
+        previous.parentNode.replaceChild(next, previous);
+      }
+      entry.element = next;
+      scrollToBottom();
+    }
+
+    function parseServerEvent(block) {
+      let event = "message";
+      const dataLines = [];
+      block.split("\n").forEach((line) => {
+        if (line.startsWith("event:")) {
+          event = line.slice(6).trim();
+        } else if (line.startsWith("data:")) {
+          dataLines.push(line.slice(5).trim());
+        }
+      });
+      if (!dataLines.length) {
+        return null;
+      }
+      return { event, data: JSON.parse(dataLines.join("\n")) };
+    }
+
+    async function readEventStream(response, onEvent) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) {
+          break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const parsed = parseServerEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+          if (parsed) {
+            onEvent(parsed);
+          }
+          boundary = buffer.indexOf("\n\n");
+        }
+      }
+    }
+
     async function sendMessage(message) {
       sendButton.disabled = true;
       inputEl.disabled = true;
@@ -406,9 +460,10 @@
       renderMessage(userEntry);
 
       const typingEntry = addTypingIndicator();
+      let assistantEntry = null;
 
       try {
-        const response = await fetch("/api/message", {
+        const response = await fetch("/api/message/stream", {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({ message }),
@@ -421,31 +476,67 @@
           );
         }
 
-        const data = await response.json();
-        const safetyAction =
-          data.safety_action === "safe_fallback"
-            ? "fallback"
-            : data.safety_action;
-        removeTypingIndicator(typingEntry);
-        const assistantEntry = {
-          role: "assistant",
-          text: data.response,
-          safetyAction,
-          policyTags: Array.isArray(data.policy_tags) ? data.policy_tags : [],
-        };
-        conversation.push(assistantEntry);
-        renderMessage(assistantEntry);
+        let finished = false;
+        await readEventStream(response, ({ event, data }) => {
+          if (event === "error") {
+            throw new Error(data.error || "The server was unable to respond.");
+          }
+
+          if (!assistantEntry) {
+            removeTypingIndicator(typingEntry);
+            assistantEntry = {
+              role: "assistant",
+              text: "",
+              safetyAction: "allow",
+              policyTags: [],
+            };
+            conversation.push(assistantEntry);
+            assistantEntry.element = renderMessage(assistantEntry);
+          }
+
+          if (event === "token") {
+            assistantEntry.text += data.text;
+            const body = assistantEntry.element.querySelector(".message-body");
+            if (body) {
+              body.innerHTML = renderMarkdown(assistantEntry.text);
+              scrollToBottom();
+            }
+          } else if (event === "done") {
+            // The final payload is authoritative: it may swap the streamed
+            // text for a moderation fallback.
+            finished = true;
+            assistantEntry.text = data.response;
+            assistantEntry.safetyAction = toSafetyAction(data.safety_action);
+            assistantEntry.policyTags = Array.isArray(data.policy_tags)
+              ? data.policy_tags
+              : [];
+            updateMessage(assistantEntry);
+          }
+        });
+
+        if (!finished) {
+          throw new Error("The response stream ended unexpectedly.");
+        }
       } catch (error) {
         console.error(error);
         removeTypingIndicator(typingEntry);
-        const errorEntry = {
-          role: "assistant",
-          text: "I encountered a technical issue and could not respond. Please try again or restart the conversation.",
-          safetyAction: "fallback",
-          policyTags: [],
-        };
-        conversation.push(errorEntry);
-        renderMessage(errorEntry);
+        const errorText =
+          "I encountered a technical issue and could not respond. Please try again or restart the conversation.";
+        if (assistantEntry) {
+          assistantEntry.text = errorText;
+          assistantEntry.safetyAction = "fallback";
+          assistantEntry.policyTags = [];
+          updateMessage(assistantEntry);
+        } else {
+          const errorEntry = {
+            role: "assistant",
+            text: errorText,
+            safetyAction: "fallback",
+            policyTags: [],
+          };
+          conversation.push(errorEntry);
+          renderMessage(errorEntry);
+        }
       } finally {
         sendButton.disabled = false;
         inputEl.disabled = false;
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Offline moderation audit of stored messages.
+Reads a JSONL corpus of user and assistant messages, runs the moderation
+checks over it in a process pool and writes one verdict per message.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, Iterator
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import MODERATION_BATCH_SIZE
+from src.io_utils import JsonlWriter, iter_jsonl
+from src.moderation import get_moderator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def _messages(
+    records: Iterator[Dict],
+    keys: Deque,
+    text_field: str,
+    role_field: str,
+    id_field: str,
+) -> Iterator[Dict]:
+    """
+    Turn corpus records into moderation messages.
+
+    The id and role of every message handed out are queued on ``keys`` so
+    they can be paired with the verdicts, which come back in input order.
+    """
+    for index, record in enumerate(records):
+        role = record.get(role_field) or "user"
+        keys.append((record.get(id_field, index), role))
+        yield {"content": record.get(text_field) or "", "role": role}
+
+
+def run_audit(
+    input_file: str,
+    output_file: str,
+    text_field: str = "content",
+    role_field: str = "role",
+    id_field: str = "id",
+    workers: int = None,
+    batch_size: int = MODERATION_BATCH_SIZE,
+    fsync_every: int = 0,
+) -> int:
+    """
+    Moderate every message of a JSONL corpus.
+
+    Args:
+        input_file: Corpus with one message per line
+        output_file: Where to write the verdicts (JSONL)
+        text_field: Record field holding the message text
+        role_field: Record field holding "user" or "assistant" (default user)
+        id_field: Record field copied to the verdict (line index if missing)
+        workers: Worker processes (None = all CPUs)
+        batch_size: Messages per worker task
+        fsync_every: Fsync the output after this many records (0 = never)
+
+    Returns:
+        Exit code (0 for success)
+    """
+    if not os.path.exists(input_file):
+        logger.error(f"Input file not found: {input_file}")
+        return 1
+
+    moderator = get_moderator()
+    keys = deque()
+    messages = _messages(
+        iter_jsonl(input_file), keys, text_field, role_field, id_field)
+    actions = Counter()
+    tags = Counter()
+    start_time = time.time()
+
+    logger.info(f"Auditing {input_file}")
+    with JsonlWriter(output_file, append=False, fsync_every=fsync_every) as writer:
+        for verdict in moderator.moderate_iter(messages, workers, batch_size):
+            message_id, role = keys.popleft()
+            writer.write({"id": message_id, "role": role, **verdict})
+            actions[verdict["action"]] += 1
+            tags.update(verdict["tags"])
+            if writer.count % 100000 == 0:
+                logger.info(f"Moderated {writer.count} messages")
+        total = writer.count
+
+    elapsed = time.time() - start_time
+    rate = total / elapsed if elapsed > 0 else 0.0
+
+    # Print summary
+    print("\n" + "="*50)
+    print("AUDIT SUMMARY")
+    print("="*50)
+    print(f"Messages: {total} ({rate:.0f}/s)")
+
+    print("\nActions:")
+    for action, count in actions.most_common():
+        percentage = (count / total) * 100 if total else 0.0
+        print(f"  {action}: {count} ({percentage:.1f}%)")
+
+    if tags:
+        print("\nTop Policy Tags:")
+        for tag, count in tags.most_common(10):
+            print(f"  {tag}: {count}")
+
+    print(f"\nVerdicts written to: {output_file}")
+    print("="*50)
+
+    return 0
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Run the moderation checks over a stored message corpus"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        required=True,
+        help="Message corpus (JSONL)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        required=True,
+        help="Output verdicts file (JSONL)"
+    )
+    parser.add_argument(
+        "--text-field",
+        type=str,
+        default="content",
+        help="Record field holding the message text (e.g. prompt)"
+    )
+    parser.add_argument(
+        "--role-field",
+        type=str,
+        default="role",
+        help="Record field holding user/assistant (missing = user)"
+    )
+    parser.add_argument(
+        "--id-field",
+        type=str,
+        default="id",
+        help="Record field copied to each verdict (missing = line index)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=MODERATION_BATCH_SIZE,
+        help="Messages sent to a worker at a time"
+    )
+    parser.add_argument(
+        "--fsync-every",
+        type=int,
+        default=0,
+        help="Fsync the output file after this many records (0 = never)"
+    )
+
+    args = parser.parse_args()
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.batch_size < 1:
+        parser.error("--batch-size must be at least 1")
+
+    exit_code = run_audit(
+        input_file=args.input,
+        output_file=args.output,
+        text_field=args.text_field,
+        role_field=args.role_field,
+        id_field=args.id_field,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        fsync_every=args.fsync_every,
+    )
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
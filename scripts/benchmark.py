@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Performance benchmarks for the moderation and chat pipeline.
+Measures throughput and percentile latency of Moderator.moderate, prompt
+building and ChatEngine.process_message against a local mock Ollama server,
+and writes machine-readable JSON results. With --baseline, exits non-zero
+when a benchmark's p50 latency regressed beyond --max-regression.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.mock_ollama import MockOllamaServer
+from src.chat_engine import ChatEngine, ChatPipeline
+from src.config import CONTEXT_WINDOW_SIZE, MODEL_NAME, SYSTEM_PROMPT, TESTS_DIR
+from src.io_utils import iter_jsonl
+from src.model_provider import ModelProvider
+from src.moderation import Moderator
+
+logger = logging.getLogger(__name__)
+
+# Building blocks for synthetic messages: mostly everyday support requests
+# with a share of crisis / medical / harmful phrasing so every check runs
+BENIGN_SENTENCES = [
+    "I've been feeling stressed about work lately.",
+    "My exams are coming up and I can't focus on studying.",
+    "I had an argument with my friend and I keep thinking about it.",
+    "Sometimes I feel lonely in the evenings after everyone goes home.",
+    "I'm not sleeping well and I wake up tired every morning.",
+    "My family expects a lot from me and it feels like pressure.",
+    "I want to learn some ways to relax when I get anxious.",
+    "It has been a long week and I just need someone to listen.",
+]
+RISK_SENTENCES = [
+    "Sometimes I think about ending my life.",
+    "What medication should I take for my anxiety?",
+    "Can you diagnose whether I have depression?",
+    "I want to hurt the people who made fun of me.",
+    "How many pills would be an overdose?",
+]
+
+# Target message lengths (characters) for the synthetic corpora
+SYNTHETIC_LENGTHS = {"short": 60, "medium": 300, "long": 1500}
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def synthetic_corpus(target_length: int, size: int, seed: int) -> List[str]:
+    """
+    Generate reproducible messages of roughly the requested length.
+
+    Args:
+        target_length: Approximate characters per message
+        size: Number of messages
+        seed: Random seed
+
+    Returns:
+        List of messages
+    """
+    rng = random.Random(seed + target_length)
+    messages = []
+    for _ in range(size):
+        parts = []
+        while sum(len(p) + 1 for p in parts) < target_length:
+            pool = RISK_SENTENCES if rng.random() < 0.2 else BENIGN_SENTENCES
+            parts.append(rng.choice(pool))
+        messages.append(" ".join(parts))
+    return messages
+
+
+def load_corpora(input_file: str, size: int, seed: int) -> Dict[str, List[str]]:
+    """
+    Build every benchmark corpus.
+
+    Args:
+        input_file: JSONL file with 'prompt' fields
+        size: Messages per synthetic corpus
+        seed: Random seed
+
+    Returns:
+        Mapping of corpus name to messages
+    """
+    corpora = {
+        f"synthetic-{name}": synthetic_corpus(length, size, seed)
+        for name, length in SYNTHETIC_LENGTHS.items()
+    }
+
+    prompts = [case.get("prompt", "") for case in iter_jsonl(input_file)]
+    corpora["inputs"] = prompts
+    # The evaluation prompts padded with everyday text, as in longer messages
+    rng = random.Random(seed)
+    corpora["inputs-long"] = [
+        " ".join(rng.sample(BENIGN_SENTENCES, 4) + [prompt] + rng.sample(BENIGN_SENTENCES, 4))
+        for prompt in prompts
+    ]
+    return corpora
+
+
+def measure(
+    name: str,
+    corpus_name: str,
+    messages: List[str],
+    func: Callable[[str], object],
+    min_calls: int,
+) -> Dict:
+    """
+    Time ``func`` on every message, repeating the corpus until ``min_calls``.
+
+    Args:
+        name: Benchmark name
+        corpus_name: Corpus name
+        messages: Inputs
+        func: Callable under test
+        min_calls: Minimum number of timed calls
+
+    Returns:
+        Result record with throughput and latency percentiles (ms)
+    """
+    # One untimed pass so caches and lazy initialization do not skew results
+    for message in messages[:min(len(messages), 10)]:
+        func(message)
+
+    durations = []
+    started = time.perf_counter()
+    while len(durations) < min_calls:
+        for message in messages:
+            call_start = time.perf_counter()
+            func(message)
+            durations.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - started
+
+    durations.sort()
+    to_ms = 1000.0
+    return {
+        "benchmark": name,
+        "corpus": corpus_name,
+        "calls": len(durations),
+        "mean_chars": round(sum(len(m) for m in messages) / len(messages), 1),
+        "throughput_per_s": round(len(durations) / elapsed, 2),
+        "latency_ms": {
+            "mean": round(sum(durations) / len(durations) * to_ms, 4),
+            "p50": round(percentile(durations, 0.50) * to_ms, 4),
+            "p90": round(percentile(durations, 0.90) * to_ms, 4),
+            "p99": round(percentile(durations, 0.99) * to_ms, 4),
+            "max": round(durations[-1] * to_ms, 4),
+        },
+    }
+
+
+def sample_history(turns: int) -> List[Dict]:
+    """Conversation history with ``turns`` user/assistant exchanges."""
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": BENIGN_SENTENCES[i % len(BENIGN_SENTENCES)]})
+        history.append({"role": "assistant", "content": "That sounds difficult. Can you tell me more about it?"})
+    return history
+
+
+def run_benchmarks(
+    corpora: Dict[str, List[str]],
+    server: MockOllamaServer,
+    selected: Sequence[str],
+    min_calls: int,
+    chat_calls: int,
+) -> List[Dict]:
+    """
+    Run the selected benchmarks over every corpus.
+
+    Args:
+        corpora: Mapping of corpus name to messages
+        server: Running mock Ollama server
+        selected: Benchmarks to run
+        min_calls: Minimum timed calls for the in-process benchmarks
+        chat_calls: Minimum timed calls for process_message
+
+    Returns:
+        List of result records
+    """
+    results = []
+    moderator = Moderator()
+    provider = ModelProvider(endpoint=server.endpoint)
+    # Every benchmark iteration must reach the (mock) model
+    provider.response_cache = None
+    pipeline = ChatPipeline(model=provider, moderator=moderator)
+    history = sample_history(CONTEXT_WINDOW_SIZE)
+
+    for corpus_name, messages in corpora.items():
+        if "moderate" in selected:
+            results.append(measure(
+                "moderate", corpus_name, messages,
+                lambda m: moderator.moderate(m),
+                min_calls,
+            ))
+
+        if "build_prompt" in selected:
+            results.append(measure(
+                "build_prompt", corpus_name, messages,
+                lambda m: provider._build_prompt(m, SYSTEM_PROMPT, history),
+                min_calls,
+            ))
+
+        if "process_message" in selected:
+            engine = ChatEngine(pipeline=pipeline)
+
+            def process(message: str):
+                engine.reset()
+                return engine.process_message(message, include_context=False)
+
+            results.append(measure(
+                "process_message", corpus_name, messages, process, chat_calls,
+            ))
+
+        logger.info(f"Finished corpus {corpus_name}")
+
+    return results
+
+
+def compare_to_baseline(results: List[Dict], baseline_file: str, max_regression: float) -> List[str]:
+    """
+    Find benchmarks whose p50 latency regressed against a previous run.
+
+    Args:
+        results: Current result records
+        baseline_file: JSON file written by an earlier run
+        max_regression: Allowed relative slowdown (0.2 = 20%)
+
+    Returns:
+        Human-readable descriptions of regressions
+    """
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    previous = {
+        (r["benchmark"], r["corpus"]): r["latency_ms"]["p50"]
+        for r in baseline.get("results", [])
+    }
+
+    regressions = []
+    for result in results:
+        before = previous.get((result["benchmark"], result["corpus"]))
+        after = result["latency_ms"]["p50"]
+        if before and after > before * (1 + max_regression):
+            regressions.append(
+                f"{result['benchmark']}/{result['corpus']}: "
+                f"p50 {before:.4f}ms -> {after:.4f}ms"
+            )
+    return regressions
+
+
+def git_revision() -> Optional[str]:
+    """Current commit hash, if the tree is a git checkout."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def print_table(results: List[Dict]):
+    """Print results as an aligned table."""
+    print("\n" + "="*92)
+    print(f"{'benchmark':<16}{'corpus':<18}{'calls':>7}{'ops/s':>12}"
+          f"{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>9}")
+    print("="*92)
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['benchmark']:<16}{r['corpus']:<18}{r['calls']:>7}"
+              f"{r['throughput_per_s']:>12.1f}{lat['p50']:>10.3f}"
+              f"{lat['p90']:>10.3f}{lat['p99']:>10.3f}{lat['max']:>9.2f}")
+    print("="*92)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark moderation and the chat pipeline"
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default=os.path.join(TESTS_DIR, "inputs.jsonl"),
+        help="Test prompts used for the inputs corpora (JSONL)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write results to this JSON file"
+    )
+    parser.add_argument(
+        "--benchmarks",
+        type=str,
+        default="moderate,build_prompt,process_message",
+        help="Comma-separated benchmarks to run"
+    )
+    parser.add_argument(
+        "--corpus-size",
+        type=int,
+        default=50,
+        help="Messages per synthetic corpus"
+    )
+    parser.add_argument(
+        "--min-calls",
+        type=int,
+        default=1000,
+        help="Minimum timed calls per in-process benchmark"
+    )
+    parser.add_argument(
+        "--chat-calls",
+        type=int,
+        default=100,
+        help="Minimum timed calls per process_message benchmark"
+    )
+    parser.add_argument(
+        "--token-delay",
+        type=float,
+        default=0.0,
+        help="Mock server seconds per generated token"
+    )
+    parser.add_argument(
+        "--prompt-delay",
+        type=float,
+        default=0.0,
+        help="Mock server seconds before the first token"
+    )
+    parser.add_argument(
+        "--reply-tokens",
+        type=int,
+        default=40,
+        help="Tokens per mock reply"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="Previous results JSON to compare p50 latencies against"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.2,
+        help="Allowed relative p50 slowdown against the baseline"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    # Per-call moderation and engine logging would dominate the timings
+    logging.getLogger("src").setLevel(logging.ERROR)
+
+    selected = [b.strip() for b in args.benchmarks.split(",") if b.strip()]
+    corpora = load_corpora(args.input, args.corpus_size, args.seed)
+
+    with MockOllamaServer(
+        reply_tokens=args.reply_tokens,
+        token_delay=args.token_delay,
+        prompt_delay=args.prompt_delay,
+    ) as server:
+        results = run_benchmarks(
+            corpora, server, selected, args.min_calls, args.chat_calls)
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model_name": MODEL_NAME,
+            "mock_server": {
+                "reply_tokens": args.reply_tokens,
+                "token_delay": args.token_delay,
+                "prompt_delay": args.prompt_delay,
+            },
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    print_table(results)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote results to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"\nFAILED: {len(regressions)} regressions against {args.baseline}")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nPASSED: no p50 regressions beyond {args.max_regression:.0%}")
+
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
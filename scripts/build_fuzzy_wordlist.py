@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Build the word list used to keep fuzzy moderation matches off real words.
+Takes the common English words of the wordfreq package (pip install
+wordfreq; only needed to run this script), keeps those a dictionary file
+confirms as real spellings, and writes the ones within two edits of a fuzzy
+term to FUZZY_WORDLIST_FILE. Moderation keywords and forms of the terms
+themselves are left out.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from typing import Iterable, List, Set
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import FUZZY_WORDLIST_FILE
+from src.matching import osa_distance
+from src.moderation import Moderator
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Twice the largest FUZZY_MATCH_DISTANCE: a token one edit from a term can
+# only tie with words at most two edits from it
+NEIGHBOURHOOD = 2
+# Rarer words (Zipf scale) are left out: obscure words such as "medicator"
+# would otherwise shadow common typos of the terms
+MIN_ZIPF_FREQUENCY = 1.5
+# Inflections accepted when the dictionary lists only the base form
+SUFFIXES = ("s", "es", "ed", "d", "ing", "ly", "er", "ers")
+
+
+def read_dictionary(paths: Iterable[str]) -> Set[str]:
+    """Lowercase alphabetic words of plain one-word-per-line dictionaries."""
+    words = set()
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                word = line.strip().lower()
+                if word.isalpha() and word.isascii():
+                    words.add(word)
+    return words
+
+
+def common_words(dictionary: Set[str]) -> Set[str]:
+    """
+    Frequent English words that are real spellings.
+
+    Frequency lists are built from web text and contain common typos, so a
+    word is kept only if the dictionary lists it or its base form.
+    """
+    try:
+        from wordfreq import iter_wordlist, zipf_frequency
+    except ImportError:
+        raise SystemExit("This script needs wordfreq: pip install wordfreq")
+
+    words = set()
+    for word in iter_wordlist("en"):
+        if not (word.isalpha() and word.isascii()):
+            continue
+        if zipf_frequency(word, "en") < MIN_ZIPF_FREQUENCY:
+            break
+        if word in dictionary or any(
+            word.endswith(suffix) and (
+                word[:-len(suffix)] in dictionary
+                or word[:-len(suffix)] + "e" in dictionary)
+            for suffix in SUFFIXES
+        ):
+            words.add(word)
+    return words
+
+
+def select_words(dictionary: Set[str], moderator: Moderator) -> List[str]:
+    """
+    Pick the dictionary words near any fuzzy term.
+
+    Args:
+        dictionary: Candidate words
+        moderator: Moderator whose fuzzy terms and keywords are used
+
+    Returns:
+        Sorted words
+    """
+    terms = [term for group in moderator.fuzzy_terms.values() for term in group]
+    keywords = set(moderator.crisis_keywords) | set(moderator.medical_keywords)
+    # Forms of a term ("suicidally", "diagnoses") are meant to match it
+    stems = tuple(term[:-1] for term in terms)
+
+    selected = []
+    for word in dictionary:
+        if word in keywords or word.startswith(stems):
+            continue
+        if any(
+            abs(len(word) - len(term)) <= NEIGHBOURHOOD
+            and osa_distance(word, term, NEIGHBOURHOOD) <= NEIGHBOURHOOD
+            for term in terms
+        ):
+            selected.append(word)
+    return sorted(selected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the fuzzy matching word list")
+    parser.add_argument(
+        "dictionaries",
+        nargs="+",
+        help="Spelling dictionaries, one word per line (e.g. /usr/share/dict/words)",
+    )
+    parser.add_argument(
+        "--output",
+        default=FUZZY_WORDLIST_FILE,
+        help="File to write",
+    )
+    args = parser.parse_args()
+
+    dictionary = common_words(read_dictionary(args.dictionaries))
+    words = select_words(dictionary, Moderator())
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write("# English words near the fuzzy moderation terms.\n")
+        f.write("# Generated by scripts/build_fuzzy_wordlist.py; do not edit.\n")
+        for word in words:
+            f.write(word + "\n")
+    logger.info(f"Wrote {len(words)} words from {len(dictionary)} to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,19 +9,22 @@ import json
 import logging
 import os
 import sys
+import threading
 import time
-from typing import Dict, List
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List
 
 # Add src to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.chat_engine import get_engine
+from src.chat_engine import ChatEngine, ChatPipeline, get_engine
 from src.config import OUTPUTS_FILE, SCHEMA_FILE, TESTS_DIR
 from src.io_utils import (
+    JsonlWriter,
+    iter_jsonl,
     load_schema,
-    read_jsonl,
     validate_record,
-    write_jsonl,
 )
 
 # Configure logging
@@ -32,6 +35,26 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+class InflightLimiter:
+    """
+    Proxy around a model provider that caps concurrent generations.
+    
+    Moderation-only cases never reach the provider, so only real model calls
+    wait for a slot.
+    """
+    
+    def __init__(self, provider, max_inflight: int):
+        self._provider = provider
+        self._slots = threading.BoundedSemaphore(max_inflight)
+    
+    def generate(self, *args, **kwargs) -> Dict:
+        with self._slots:
+            return self._provider.generate(*args, **kwargs)
+    
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+
 def evaluate_single(engine, test_case: Dict) -> Dict:
     """
     Evaluate a single test case.
@@ -65,6 +88,7 @@ def evaluate_single(engine, test_case: Dict) -> Dict:
             "latency_ms": result.get("latency_ms", 0),
             "model_name": result.get("model_name", "unknown"),
             "deterministic": result.get("deterministic", True),
+            "timings": result.get("timings", {}),
         }
         
         return output
@@ -83,28 +107,137 @@ def evaluate_single(engine, test_case: Dict) -> Dict:
         }
 
 
+def evaluate_serial(engine, test_cases: Iterable[Dict]) -> Iterator[Dict]:
+    """
+    Evaluate test cases one after another on a single engine.
+    
+    Args:
+        engine: Chat engine instance
+        test_cases: Test inputs with 'id' and 'prompt' fields
+        
+    Yields:
+        Evaluation results in input order
+    """
+    for i, test_case in enumerate(test_cases):
+        # Brief delay to avoid overwhelming the model
+        if i:
+            time.sleep(0.1)
+        yield evaluate_single(engine, test_case)
+
+
+def evaluate_parallel(
+    test_cases: Iterable[Dict],
+    workers: int,
+    max_inflight: int,
+) -> Iterator[Dict]:
+    """
+    Evaluate test cases concurrently.
+    
+    Every case runs in its own session on a shared pipeline, so results do
+    not depend on scheduling. At most ``2 * workers`` cases are buffered at
+    a time and results are yielded in input order.
+    
+    Args:
+        test_cases: Test inputs with 'id' and 'prompt' fields
+        workers: Number of cases processed at once
+        max_inflight: Maximum concurrent requests sent to Ollama
+        
+    Yields:
+        Evaluation results in input order
+    """
+    pipeline = ChatPipeline()
+    # Never queue inside the provider's scheduler, where waits can time out
+    scheduler_limit = pipeline.model.scheduler.max_concurrency
+    if max_inflight > scheduler_limit:
+        logger.info(f"Limiting in-flight model requests to {scheduler_limit} (GENERATION_MAX_CONCURRENCY)")
+        max_inflight = scheduler_limit
+    pipeline.model = InflightLimiter(pipeline.model, max_inflight)
+    
+    def run_case(test_case: Dict) -> Dict:
+        return evaluate_single(ChatEngine(pipeline=pipeline), test_case)
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for test_case in test_cases:
+            pending.append(executor.submit(run_case, test_case))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class EvaluationSummary:
+    """Running statistics over evaluation outputs, kept in constant memory."""
+    
+    def __init__(self):
+        self.completed = 0
+        self.safety_counts: Dict[str, int] = {}
+        self.failed_validations: List[str] = []
+        self.latency_count = 0
+        self.latency_total = 0
+        self.latency_min = None
+        self.latency_max = None
+        # Per-stage totals and maxima over outputs that carry timings
+        self.timing_count = 0
+        self.timing_totals: Dict[str, float] = {}
+        self.timing_max: Dict[str, float] = {}
+    
+    def add(self, output: Dict):
+        """Account for one output record."""
+        self.completed += 1
+        
+        action = output.get("safety_action", "unknown")
+        self.safety_counts[action] = self.safety_counts.get(action, 0) + 1
+        
+        latency = output.get("latency_ms")
+        if latency:
+            self.latency_count += 1
+            self.latency_total += latency
+            self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+            self.latency_max = latency if self.latency_max is None else max(self.latency_max, latency)
+        
+        timings = output.get("timings")
+        if timings:
+            self.timing_count += 1
+            for stage, value in timings.items():
+                self.timing_totals[stage] = self.timing_totals.get(stage, 0) + value
+                self.timing_max[stage] = max(self.timing_max.get(stage, 0), value)
+
+
 def run_evaluation(
     input_file: str,
     output_file: str,
     schema_file: str,
+    workers: int = 1,
+    max_inflight: int = 1,
+    resume: bool = False,
+    fsync_every: int = 0,
 ) -> int:
     """
     Run evaluation on all test cases.
     
+    Inputs are streamed and every output is appended to the output file as
+    soon as it is ready, so memory use is constant and a killed run can be
+    continued with ``resume``.
+    
     Args:
         input_file: Path to input JSONL file
         output_file: Path to output JSONL file
         schema_file: Path to schema JSON file
+        workers: Number of test cases evaluated concurrently
+        max_inflight: Maximum concurrent model requests when workers > 1
+        resume: Keep existing outputs and skip test ids already written
+        fsync_every: Fsync the output file after this many records (0 = never)
         
     Returns:
         Exit code (0 for success, non-zero for failure)
     """
     logger.info("Starting evaluation")
     
-    # Load test cases
+    # Count test cases (also checks the file parses) without loading them
     try:
-        test_cases = read_jsonl(input_file)
-        logger.info(f"Loaded {len(test_cases)} test cases")
+        total = sum(1 for _ in iter_jsonl(input_file))
+        logger.info(f"Found {total} test cases")
     except Exception as e:
         logger.error(f"Failed to load test cases: {e}")
         return 1
@@ -120,75 +253,98 @@ def run_evaluation(
     # Initialize engine
     try:
         engine = get_engine()
+        # Fail now rather than record "model unavailable" replies as results
+        engine.model.verify_connection()
+        # Keep the model load out of the first test's latency
+        engine.model.warm_up()
         logger.info("Initialized chat engine")
     except Exception as e:
         logger.error(f"Failed to initialize engine: {e}")
         return 1
     
-    # Evaluate all test cases
-    outputs = []
-    failed_validations = []
+    summary = EvaluationSummary()
     
-    for i, test_case in enumerate(test_cases, 1):
-        logger.info(f"Processing test {i}/{len(test_cases)}")
+    try:
+        writer = JsonlWriter(output_file, append=resume, fsync_every=fsync_every)
+    except Exception as e:
+        logger.error(f"Failed to open output file: {e}")
+        return 1
+    
+    with writer:
+        # Outputs already written by an interrupted run count towards the summary
+        completed_ids = set()
+        if resume:
+            for output in iter_jsonl(output_file):
+                completed_ids.add(output.get("id"))
+                summary.add(output)
+            if completed_ids:
+                logger.info(f"Resuming: {len(completed_ids)} test cases already completed")
         
-        # Evaluate
-        output = evaluate_single(engine, test_case)
-        outputs.append(output)
+        def pending_cases() -> Iterator[Dict]:
+            for i, test_case in enumerate(iter_jsonl(input_file), 1):
+                if test_case.get("id", "unknown") in completed_ids:
+                    continue
+                logger.info(f"Processing test {i}/{total}")
+                yield test_case
         
-        # Validate against schema
-        if not validate_record(output, schema):
-            failed_validations.append(output["id"])
-            logger.warning(f"Test {output['id']} failed schema validation")
+        # Evaluate all test cases
+        if workers > 1:
+            logger.info(f"Evaluating with {workers} workers, {max_inflight} in-flight model requests")
+            outputs = evaluate_parallel(pending_cases(), workers, max_inflight)
+        else:
+            outputs = evaluate_serial(engine, pending_cases())
         
-        # Brief delay to avoid overwhelming the model
-        if i < len(test_cases):
-            time.sleep(0.1)
+        for output in outputs:
+            # Validate against schema
+            if not validate_record(output, schema):
+                summary.failed_validations.append(output["id"])
+                logger.warning(f"Test {output['id']} failed schema validation")
+            
+            try:
+                writer.write(output)
+            except Exception as e:
+                logger.error(f"Failed to write outputs: {e}")
+                return 1
+            summary.add(output)
     
-    # Write outputs
-    try:
-        write_jsonl(outputs, output_file)
-        logger.info(f"Wrote outputs to {output_file}")
-    except Exception as e:
-        logger.error(f"Failed to write outputs: {e}")
-        return 1
+    logger.info(f"Wrote outputs to {output_file}")
     
     # Print summary
     print("\n" + "="*60)
     print("EVALUATION SUMMARY")
     print("="*60)
-    print(f"Total tests: {len(test_cases)}")
-    print(f"Completed: {len(outputs)}")
-    print(f"Schema violations: {len(failed_validations)}")
-    
-    # Count safety actions
-    safety_counts = {}
-    for output in outputs:
-        action = output.get("safety_action", "unknown")
-        safety_counts[action] = safety_counts.get(action, 0) + 1
+    print(f"Total tests: {total}")
+    print(f"Completed: {summary.completed}")
+    print(f"Schema violations: {len(summary.failed_validations)}")
     
     print("\nSafety Actions:")
-    for action, count in safety_counts.items():
+    for action, count in summary.safety_counts.items():
         print(f"  {action}: {count}")
     
     # Calculate statistics
-    latencies = [o.get("latency_ms", 0) for o in outputs if o.get("latency_ms")]
-    if latencies:
+    if summary.latency_count:
         print(f"\nLatency Statistics:")
-        print(f"  Min: {min(latencies)}ms")
-        print(f"  Max: {max(latencies)}ms")
-        print(f"  Avg: {sum(latencies)/len(latencies):.1f}ms")
+        print(f"  Min: {summary.latency_min}ms")
+        print(f"  Max: {summary.latency_max}ms")
+        print(f"  Avg: {summary.latency_total/summary.latency_count:.1f}ms")
+    
+    if summary.timing_count:
+        print(f"\nStage Timings (mean / max over {summary.timing_count} tests):")
+        for stage, total in summary.timing_totals.items():
+            mean = total / summary.timing_count
+            print(f"  {stage}: {mean:.3f} / {summary.timing_max[stage]:.3f}")
     
     print("="*60)
     
     # Determine exit code
+    failed_validations = summary.failed_validations
     if failed_validations:
         print(f"\nFAILED: {len(failed_validations)} schema violations")
         print(f"Failed IDs: {', '.join(failed_validations)}")
         return 1
     
-    if len(outputs) < len(test_cases):
-        print(f"\nFAILED: Only {len(outputs)}/{len(test_cases)} tests completed")
+    if summary.completed < total:
+        print(f"\nFAILED: Only {summary.completed}/{total} tests completed")
         return 1
     
     print("\nPASSED: All tests completed successfully")
@@ -218,14 +374,45 @@ def main():
         default=SCHEMA_FILE,
         help="Output schema file (JSON)"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of test cases evaluated concurrently"
+    )
+    parser.add_argument(
+        "--max-inflight",
+        type=int,
+        default=None,
+        help="Maximum concurrent Ollama requests (default: same as --workers)"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Append to an existing output file, skipping test ids already written"
+    )
+    parser.add_argument(
+        "--fsync-every",
+        type=int,
+        default=0,
+        help="Fsync the output file after this many records (0 = never)"
+    )
     
     args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.max_inflight is not None and args.max_inflight < 1:
+        parser.error("--max-inflight must be at least 1")
     
     # Run evaluation
     exit_code = run_evaluation(
         input_file=args.input,
         output_file=args.output,
         schema_file=args.schema,
+        workers=args.workers,
+        max_inflight=args.max_inflight or args.workers,
+        resume=args.resume,
+        fsync_every=args.fsync_every,
     )
     
     sys.exit(exit_code)
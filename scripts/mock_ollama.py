@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Minimal stand-in for the Ollama HTTP API, for benchmarks and offline runs.
+Implements /api/tags and /api/generate (streaming, non-streaming and
+empty-prompt load requests) with configurable per-token delays. Replies
+are generic supportive text, so output moderation lets them through.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+REPLY_WORDS = (
+    "Thank you for sharing that with me. It sounds like you are carrying "
+    "a lot right now, and it makes sense to feel this way. Would you like "
+    "to tell me more about what has been on your mind lately?"
+).split()
+
+
+class MockOllamaServer:
+    """
+    Threaded HTTP server imitating the parts of Ollama the providers use.
+
+    Usage:
+        with MockOllamaServer(token_delay=0.005) as server:
+            provider = ModelProvider(endpoint=server.endpoint)
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        model_name: str = MODEL_NAME,
+        reply_tokens: int = 40,
+        token_delay: float = 0.0,
+        prompt_delay: float = 0.0,
+    ):
+        """
+        Configure the stub.
+
+        Args:
+            host: Interface to bind
+            port: Port to bind (0 picks a free one)
+            model_name: Model reported by /api/tags and in replies
+            reply_tokens: Number of tokens in every reply
+            token_delay: Seconds spent per generated token
+            prompt_delay: Seconds spent before the first token (prompt eval)
+        """
+        self.model_name = model_name
+        self.reply_tokens = reply_tokens
+        self.token_delay = token_delay
+        self.prompt_delay = prompt_delay
+        self.request_count = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        """Base URL to pass to ModelProvider."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _reply_tokens(self) -> List[str]:
+        """Tokens of the canned reply, cycling through REPLY_WORDS."""
+        return [
+            REPLY_WORDS[i % len(REPLY_WORDS)] + " "
+            for i in range(self.reply_tokens)
+        ]
+
+    def _final_chunk(self, request: Dict, tokens: List[str]) -> Dict:
+        """Last generate payload with Ollama-style counters (nanoseconds)."""
+        prompt_tokens = len(request.get("prompt", "").split())
+        return {
+            "model": self.model_name,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "response": "",
+            "done": True,
+            "context": list(range(prompt_tokens + len(tokens))),
+            "total_duration": int((self.prompt_delay + self.token_delay * len(tokens)) * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(self.prompt_delay * 1e9),
+            "eval_count": len(tokens),
+            "eval_duration": int(self.token_delay * len(tokens) * 1e9),
+        }
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes; without this,
+            # delayed ACKs add ~40ms to every response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+            def _send_json(self, payload: Dict, status: int = 200):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload: Dict):
+                data = (json.dumps(payload) + "\n").encode("utf-8")
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path != "/api/tags":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                self._send_json({"models": [{"name": server.model_name}]})
+
+            def do_POST(self):
+                if self.path != "/api/generate":
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                server.request_count += 1
+
+                if not request.get("prompt"):
+                    # Load / keep-alive request: nothing to generate
+                    self._send_json({
+                        "model": server.model_name,
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        "response": "",
+                        "done": True,
+                        "done_reason": "load",
+                    })
+                    return
+
+                tokens = server._reply_tokens()
+                final = server._final_chunk(request, tokens)
+                time.sleep(server.prompt_delay)
+
+                if not request.get("stream", True):
+                    time.sleep(server.token_delay * len(tokens))
+                    self._send_json(dict(final, response="".join(tokens)))
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        time.sleep(server.token_delay)
+                        self._send_chunk({
+                            "model": server.model_name,
+                            "response": token,
+                            "done": False,
+                        })
+                    self._send_chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client stopped reading (e.g. output moderation cut)
+                    pass
+
+        return Handler
+
+    def start(self) -> "MockOllamaServer":
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Mock Ollama listening on {self.endpoint}")
+        return self
+
+    def serve_forever(self):
+        """Serve requests in the calling thread until interrupted."""
+        logger.info(f"Mock Ollama listening on {self.endpoint}")
+        try:
+            self._server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._server.server_close()
+
+    def stop(self):
+        """Shut the server down."""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(
+        description="Run a stub Ollama server for offline testing"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=11434,
+        help="Port to listen on (default: Ollama's port)"
+    )
+    parser.add_argument(
+        "--reply-tokens",
+        type=int,
+        default=40,
+        help="Tokens per reply"
+    )
+    parser.add_argument(
+        "--token-delay",
+        type=float,
+        default=0.0,
+        help="Seconds per generated token"
+    )
+    parser.add_argument(
+        "--prompt-delay",
+        type=float,
+        default=0.0,
+        help="Seconds before the first token"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    server = MockOllamaServer(
+        host=args.host,
+        port=args.port,
+        reply_tokens=args.reply_tokens,
+        token_delay=args.token_delay,
+        prompt_delay=args.prompt_delay,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Asyncio model provider for Ollama integration.
+Mirrors ModelProvider on top of a pooled, non-blocking aiohttp client so a
+single process can hold many slow generations without a thread per request.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from .config import (
+    ASYNC_KEEPALIVE_SECONDS,
+    ASYNC_MAX_CONNECTIONS,
+    TIMEOUT_SECONDS,
+)
+from .model_provider import BaseModelProvider, elapsed_ms, get_provider, get_scheduler
+from .prompt_budget import get_prompt_assembler
+from .response_cache import get_response_cache
+
+logger = logging.getLogger(__name__)
+
+# Same retry policy as the blocking provider's urllib3 Retry
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 1
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+async def _close_at_shutdown(session: aiohttp.ClientSession):
+    """
+    Close ``session`` when its event loop finalizes async generators.
+
+    asyncio.run() (and loop.shutdown_asyncgens()) closes every started async
+    generator while the loop is still running, so the session's pooled
+    connections are released on the loop they belong to.
+    """
+    try:
+        yield
+    finally:
+        if not session.closed:
+            await session.close()
+
+
+class AsyncModelProvider(BaseModelProvider):
+    """Handles communication with Ollama API using asyncio."""
+
+    def __init__(self):
+        """Initialize the provider; HTTP clients are created on first use."""
+        # One pooled client per event loop; a session is only usable on the
+        # loop that created it
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]"
+        self._sessions = weakref.WeakKeyDictionary()
+        self._session_guards = weakref.WeakKeyDictionary()
+        self.response_cache = get_response_cache()
+        self.prompt_assembler = get_prompt_assembler()
+        # Same slots and queue as the blocking provider
+        self.scheduler = get_scheduler()
+        # Same health monitor too, and asyncio traffic counts as activity for
+        # the blocking provider's keep-alive warmer
+        self._blocking_provider = get_provider()
+        self.health = self._blocking_provider.health
+
+    def _ensure_ready(self):
+        """Fail fast while the shared health monitor finds the model unavailable."""
+        self._blocking_provider._ensure_ready()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled client session bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=ASYNC_MAX_CONNECTIONS,
+                limit_per_host=ASYNC_MAX_CONNECTIONS,
+                keepalive_timeout=ASYNC_KEEPALIVE_SECONDS,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=TIMEOUT_SECONDS),
+            )
+            guard = _close_at_shutdown(session)
+            await guard.asend(None)
+            self._sessions[loop] = session
+            self._session_guards[loop] = guard
+        return session
+
+    async def close(self):
+        """Close the pooled HTTP clients of every event loop."""
+        current = asyncio.get_running_loop()
+        sessions = list(self._sessions.items())
+        self._sessions.clear()
+        self._session_guards.clear()
+        for loop, session in sessions:
+            if session.closed:
+                continue
+            if loop is current:
+                await session.close()
+            elif loop.is_running():
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(session.close(), loop))
+
+    async def __aenter__(self) -> "AsyncModelProvider":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _post(self, path: str, payload: Dict) -> aiohttp.ClientResponse:
+        """POST with retries on transient statuses; caller must release the response."""
+        session = await self._get_session()
+        for attempt in range(RETRY_TOTAL + 1):
+            response = await session.post(f"{self.endpoint}{path}", json=payload)
+            if response.status not in RETRY_STATUSES or attempt == RETRY_TOTAL:
+                response.raise_for_status()
+                return response
+            response.release()
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * (2 ** attempt))
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    async def verify_connection(self):
+        """Verify Ollama is running and model is available."""
+        try:
+            session = await self._get_session()
+            async with session.get(
+                f"{self.endpoint}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                response.raise_for_status()
+                self._check_model_available(await response.json())
+
+            logger.info(f"Successfully connected to Ollama with model {self.model_name}")
+
+        except aiohttp.ClientConnectionError:
+            raise RuntimeError(
+                "Cannot connect to Ollama. Please ensure:\n"
+                "1. Ollama is installed\n"
+                "2. Ollama service is running (run: ollama serve)\n"
+                "3. Port 11434 is not blocked"
+            )
+        except Exception as e:
+            raise RuntimeError(f"Failed to verify Ollama connection: {e}")
+
+    async def generate(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        context: Optional[List[int]] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict:
+        """
+        Generate response from the model.
+
+        Args:
+            prompt: User input prompt
+            system_prompt: System prompt for behavior
+            conversation_history: Previous conversation turns
+            context: Token context returned by a previous generation
+            session_id: Session the request belongs to, for fair scheduling
+            **kwargs: Additional parameters to override defaults
+
+        Returns:
+            Dict containing response and metadata
+
+        Raises:
+            ModelUnavailable: If the model is known to be unreachable
+            SchedulerBusy: If no generation slot is available in time
+        """
+        start_time = time.time()
+        stage_start = time.perf_counter()
+        request_data = self._prepare_request(
+            prompt, system_prompt, conversation_history, context,
+            stream=False, **kwargs
+        )
+        prompt_build_ms = elapsed_ms(stage_start)
+        cached = self._cached_result(request_data, start_time, prompt_build_ms)
+        if cached is not None:
+            return cached
+        self._ensure_ready()
+
+        try:
+            logger.debug(f"Sending request to model: {json.dumps(request_data, indent=2)}")
+
+            async with self.scheduler.aslot(session_id):
+                stage_start = time.perf_counter()
+                response = await self._post("/api/generate", request_data)
+                async with response:
+                    result = await response.json()
+
+            formatted = self._format_result(
+                result, result.get("response", ""), request_data, start_time,
+                prompt_build_ms, elapsed_ms(stage_start),
+            )
+            self._store_result(request_data, formatted)
+            return formatted
+
+        except asyncio.TimeoutError:
+            logger.error(f"Model request timed out after {TIMEOUT_SECONDS}s")
+            raise TimeoutError(f"Model generation timed out after {TIMEOUT_SECONDS}s")
+        except aiohttp.ClientError as e:
+            logger.error(f"Model request failed: {e}")
+            if isinstance(e, aiohttp.ClientConnectionError):
+                self.health.report_failure(e)
+            raise RuntimeError(f"Failed to generate response: {e}")
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        context: Optional[List[int]] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[Dict]:
+        """
+        Generate a response, yielding tokens as Ollama emits them.
+
+        Yields:
+            {"token": str, "done": False} for each token, then a final dict
+            with the same keys as generate() plus "done": True
+
+        Raises:
+            ModelUnavailable: If the model is known to be unreachable
+            SchedulerBusy: If no generation slot is available in time
+        """
+        start_time = time.time()
+        stage_start = time.perf_counter()
+        request_data = self._prepare_request(
+            prompt, system_prompt, conversation_history, context,
+            stream=True, **kwargs
+        )
+        prompt_build_ms = elapsed_ms(stage_start)
+        cached = self._cached_result(request_data, start_time, prompt_build_ms)
+        if cached is not None:
+            if cached["response"]:
+                yield {"token": cached["response"], "done": False}
+            yield cached
+            return
+        self._ensure_ready()
+
+        try:
+            async with self.scheduler.aslot(session_id):
+                stage_start = time.perf_counter()
+                response = await self._post("/api/generate", request_data)
+                pieces = []
+                result: Dict = {}
+                async with response:
+                    async for line in response.content:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise RuntimeError(f"Failed to generate response: {chunk['error']}")
+                        token = chunk.get("response", "")
+                        if token:
+                            pieces.append(token)
+                            yield {"token": token, "done": False}
+                        if chunk.get("done"):
+                            result = chunk
+                            break
+
+            formatted = self._format_result(
+                result, "".join(pieces), request_data, start_time,
+                prompt_build_ms, elapsed_ms(stage_start),
+            )
+            self._store_result(request_data, formatted)
+            yield formatted
+
+        except asyncio.TimeoutError:
+            logger.error(f"Model request timed out after {TIMEOUT_SECONDS}s")
+            raise TimeoutError(f"Model generation timed out after {TIMEOUT_SECONDS}s")
+        except aiohttp.ClientError as e:
+            logger.error(f"Model request failed: {e}")
+            if isinstance(e, aiohttp.ClientConnectionError):
+                self.health.report_failure(e)
+            raise RuntimeError(f"Failed to generate response: {e}")
+
+    async def health_check(self) -> bool:
+        """
+        Check if model provider is healthy.
+
+        Returns:
+            True if healthy, False otherwise
+        """
+        try:
+            session = await self._get_session()
+            async with session.get(
+                f"{self.endpoint}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+
+# Singleton instance
+_async_provider_instance = None
+_async_provider_lock = threading.Lock()
+
+
+def get_async_provider() -> AsyncModelProvider:
+    """Get or create singleton async model provider instance."""
+    global _async_provider_instance
+    if _async_provider_instance is None:
+        with _async_provider_lock:
+            if _async_provider_instance is None:
+                _async_provider_instance = AsyncModelProvider()
+    return _async_provider_instance
@@ -3,40 +3,102 @@ Chat engine module - orchestrates conversation flow with safety checks.
 Students must complete TODO sections to implement safe conversation management.
 """
 
+import gc
 import json
 import logging
+import threading
 import time
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
 
 from .config import (
     SYSTEM_PROMPT,
     MAX_CONVERSATION_TURNS,
     CONTEXT_WINDOW_SIZE,
+    PROMPT_TOKEN_BUDGET,
+    STREAM_MODERATION_WINDOW,
+    TEMPERATURE,
+)
+from . import metrics
+from .model_provider import (
+    ModelUnavailable,
+    SchedulerBusy,
+    elapsed_ms,
+    get_provider,
 )
-from .model_provider import get_provider
 from .moderation import (
     ModerationAction,
     ModerationResult,
     get_moderator,
 )
+from .prompt_budget import estimate_tokens, get_prompt_assembler
+from .session_state import SessionState
 
 logger = logging.getLogger(__name__)
 
+# Responses used when moderation blocks or redirects without a template
+BLOCK_RESPONSE = "I cannot assist with that request. If you have other questions or need support with appropriate topics, I'm here to help."
+SAFE_FALLBACK_RESPONSE = "Let me redirect you to appropriate resources. If you're in crisis, please contact emergency services or a crisis helpline immediately."
+
+# Shown when the generation queue is full; the user can simply retry
+BUSY_RESPONSE = "I'm receiving a lot of messages right now. Please wait a moment and send your message again."
+
+# Shown while Ollama is unreachable or still loading the model; safety
+# responses that need no model are served as usual
+WARMING_UP_RESPONSE = "I'm still getting ready to chat. Please send your message again in a moment. If you need urgent help, please contact local emergency services or a crisis helpline."
+
+# Keys of the per-turn "timings" record, in pipeline order. Durations are
+# milliseconds; the *_count entries are Ollama token counts.
+TIMING_KEYS = (
+    "input_moderation_ms",
+    "prompt_build_ms",
+    "http_wait_ms",
+    "prompt_eval_ms",
+    "eval_ms",
+    "prompt_eval_count",
+    "eval_count",
+    "output_moderation_ms",
+    "history_update_ms",
+)
+
+# Upper bound on prebuilt moderation-only payloads kept by a pipeline
+MAX_FALLBACK_PAYLOADS = 256
 
-class ChatEngine:
-    """Orchestrates conversation flow with safety checks."""
 
-    def __init__(self):
-        """Initialize chat engine with model and moderator."""
-        self.model = get_provider()
-        self.moderator = get_moderator()
-        self.conversation_history: List[Dict] = []
-        self.turn_count = 0  # number of user->assistant turns completed
-        self.session_id = f"session_{int(time.time())}"
-        self.first_interaction = True
+class ChatPipeline:
+    """
+    Orchestrates conversation flow with safety checks.
+
+    One pipeline is shared by every session. It keeps no per-conversation
+    data: each call receives the SessionState to read and update, so the
+    same instance can serve many threads at once.
+    """
+
+    def __init__(self, model=None, moderator=None):
+        """
+        Initialize the pipeline with model and moderator.
+
+        Args:
+            model: Model provider; the shared one if omitted
+            moderator: Moderator; the shared one if omitted
+        """
+        self.model = model or get_provider()
+        self.moderator = moderator or get_moderator()
+        # Prebuilt responses for blocked / redirected turns, see _fallback_payload
+        self._fallback_payloads: Dict[Tuple, Mapping[str, str]] = {}
+        # Safety texts repeated in history are replaced by short notes when
+        # prompts are rebuilt
+        templates = self.moderator.fallback_templates
+        get_prompt_assembler().add_placeholders({
+            templates["crisis"]: "[Crisis support resources were shared.]",
+            templates["medical"]: "[Medical questions were referred to a licensed professional.]",
+            templates["harmful"]: "[A potentially harmful request was declined.]",
+            templates["disclaimer"]: "[The support disclaimer was shown.]",
+        })
 
     def process_message(
         self,
+        state: SessionState,
         user_input: str,
         include_context: bool = True,
     ) -> Dict:
@@ -55,6 +117,7 @@ class ChatEngine:
         6. Update history and add metadata (already implemented)
 
         Args:
+            state: Session to continue; updated in place
             user_input: User's message
             include_context: Whether to include conversation history
 
@@ -67,6 +130,7 @@ class ChatEngine:
             - model_name: Model used or status indicator
             - deterministic: Boolean indicating if response is deterministic
             - latency_ms: Processing time in milliseconds
+            - timings: Per-stage breakdown with the keys in TIMING_KEYS
             - turn_count: Current conversation turn number
             - session_id: Unique session identifier
         """
@@ -74,14 +138,12 @@ class ChatEngine:
         start_time = time.time()
 
         # Step 1: Handle first interaction disclaimer
-        disclaimer = None
-        if self.first_interaction:
-            self.first_interaction = False
-            # Get disclaimer to include in response
-            disclaimer = self.moderator.get_disclaimer()
+        disclaimer = self._take_disclaimer(state)
 
         # Step 2: Moderate user input
-        input_moderation = self._moderate_input(user_input)
+        stage_start = time.perf_counter()
+        input_moderation = self._moderate_input(state, user_input)
+        timings = {"input_moderation_ms": elapsed_ms(stage_start)}
 
         # TODO: Step 3 - Handle moderation results
         # CRITICAL: Different actions require different handling:
@@ -89,76 +151,389 @@ class ChatEngine:
         # - SAFE_FALLBACK: Return immediately with safety resources (no model generation)
         # - ALLOW: Continue to model generation
 
-        if input_moderation.action == ModerationAction.BLOCK:
-            model_stub = {"response": "",
-                          "model": "blocked", "deterministic": True}
-            output_stub = ModerationResult(
-                action=ModerationAction.ALLOW,
-                tags=[],
-                reason="Output moderation bypassed due to input block",
-                confidence=1.0,
-            )
-            final_response = self._prepare_final_response(
-                user_input=user_input,
-                model_response=model_stub,
-                input_moderation=input_moderation,
-                output_moderation=output_stub,
-            )
+        if input_moderation.action != ModerationAction.ALLOW:
+            return self._respond_without_model(
+                state, user_input, input_moderation, disclaimer, start_time,
+                timings)
+
+        # Step 3: Generate model response (input passed moderation)
+        generation_args, prompt_span = self._generation_args(
+            state, user_input, include_context)
+        model_response = self._generate_response(generation_args)
+        if model_response.get("rejected"):
+            return self._reject_turn(
+                state, user_input, model_response, disclaimer, start_time,
+                timings)
+
+        # Step 4: Moderate model output
+        stage_start = time.perf_counter()
+        output_moderation = self._moderate_output(
+            model_response["response"]
+        )
+        timings["output_moderation_ms"] = elapsed_ms(stage_start)
+
+        # Steps 5-7: Prepare final response, update history, add metadata
+        return self._finalize_turn(
+            state=state,
+            user_input=user_input,
+            model_response=model_response,
+            input_moderation=input_moderation,
+            output_moderation=output_moderation,
+            disclaimer=disclaimer,
+            start_time=start_time,
+            include_context=include_context,
+            prompt_span=prompt_span,
+            timings=timings,
+        )
 
-            if disclaimer:
-                final_response["response"] = f"{disclaimer}\n\n---\n\n{final_response['response']}"
+    def process_message_stream(
+        self,
+        state: SessionState,
+        user_input: str,
+        include_context: bool = True,
+    ) -> Iterator[Dict]:
+        """
+        Process a message like process_message, streaming the model reply.
 
-            self._update_history(user_input, final_response["response"])
+        Output moderation runs over a sliding window of the most recent
+        STREAM_MODERATION_WINDOW characters after every token. A violation
+        stops generation before the offending token is sent, and the final
+        result carries the fallback response instead.
 
-            final_response["latency_ms"] = int(
-                (time.time() - start_time) * 1000)
-            final_response["turn_count"] = self.turn_count
-            final_response["session_id"] = self.session_id
+        Args:
+            state: Session to continue; updated in place
+            user_input: User's message
+            include_context: Whether to include conversation history
 
-            return final_response
+        Yields:
+            {"type": "token", "text": str} for each piece of response text,
+            then {"type": "done", "result": Dict} with the same keys as
+            process_message. The final response replaces the streamed text.
+        """
+        start_time = time.time()
 
-        elif input_moderation.action == ModerationAction.SAFE_FALLBACK:
-            model_stub = {"response": "",
-                          "model": "safe_fallback", "deterministic": True}
-            output_stub = ModerationResult(
-                action=ModerationAction.ALLOW,
-                tags=[],
-                reason="Output moderation bypassed due to safe fallback",
-                confidence=1.0,
-            )
-            final_response = self._prepare_final_response(
+        disclaimer = self._take_disclaimer(state)
+
+        stage_start = time.perf_counter()
+        input_moderation = self._moderate_input(state, user_input)
+        timings = {"input_moderation_ms": elapsed_ms(stage_start)}
+        if input_moderation.action != ModerationAction.ALLOW:
+            yield {
+                "type": "done",
+                "result": self._respond_without_model(
+                    state, user_input, input_moderation, disclaimer,
+                    start_time, timings),
+            }
+            return
+
+        if disclaimer:
+            yield {"type": "token", "text": f"{disclaimer}\n\n---\n\n"}
+
+        model_response = None
+        output_moderation = None
+        streamed = ""
+        # Output moderation runs once per token; report the total
+        moderation_seconds = 0.0
+        generation_args, prompt_span = self._generation_args(
+            state, user_input, include_context)
+        stream = self._generate_response_stream(generation_args)
+        try:
+            for chunk in stream:
+                if chunk.get("done"):
+                    model_response = chunk
+                    break
+
+                token = chunk["token"]
+                streamed += token
+                # The window always covers the whole new token (a cached
+                # response arrives as one large token)
+                stage_start = time.perf_counter()
+                window_moderation = self._moderate_output(self._stream_window(
+                    streamed, STREAM_MODERATION_WINDOW + len(token)))
+                moderation_seconds += time.perf_counter() - stage_start
+                if window_moderation.action != ModerationAction.ALLOW:
+                    output_moderation = window_moderation
+                    break
+
+                yield {"type": "token", "text": token}
+        finally:
+            stream.close()
+
+        if model_response is not None and model_response.get("rejected"):
+            yield {
+                "type": "done",
+                "result": self._reject_turn(
+                    state, user_input, model_response, disclaimer,
+                    start_time, timings),
+            }
+            return
+
+        if model_response is None:
+            # Generation was cut short, no final payload from the provider
+            model_response = {
+                "response": streamed,
+                "model": self.model.model_name,
+                "deterministic": TEMPERATURE == 0,
+            }
+
+        if output_moderation is None:
+            stage_start = time.perf_counter()
+            output_moderation = self._moderate_output(
+                model_response["response"])
+            moderation_seconds += time.perf_counter() - stage_start
+        timings["output_moderation_ms"] = round(moderation_seconds * 1000, 3)
+
+        yield {
+            "type": "done",
+            "result": self._finalize_turn(
+                state=state,
                 user_input=user_input,
-                model_response=model_stub,
+                model_response=model_response,
                 input_moderation=input_moderation,
-                output_moderation=output_stub,
-            )
+                output_moderation=output_moderation,
+                disclaimer=disclaimer,
+                start_time=start_time,
+                include_context=include_context,
+                prompt_span=prompt_span,
+                timings=timings,
+            ),
+        }
 
-            if disclaimer:
-                final_response["response"] = f"{disclaimer}\n\n---\n\n{final_response['response']}"
+    @staticmethod
+    def _stream_window(streamed: str, size: int) -> str:
+        """
+        Return the trailing part of streamed text to re-moderate.
 
-            self._update_history(user_input, final_response["response"])
+        The window holds at least the last ``size`` characters and starts
+        after a whitespace character. A window cut mid-word could match
+        word-boundary patterns the full text does not (e.g. "mistake 5 mg"
+        cut to "take 5 mg").
+        """
+        start = len(streamed) - size
+        if start <= 0:
+            return streamed
+        while start > 0 and not streamed[start - 1].isspace():
+            start -= 1
+        return streamed[start:]
+
+    async def aprocess_message(
+        self,
+        state: SessionState,
+        user_input: str,
+        include_context: bool = True,
+    ) -> Dict:
+        """
+        Asyncio counterpart of process_message.
 
-            final_response["latency_ms"] = int(
-                (time.time() - start_time) * 1000)
-            final_response["turn_count"] = self.turn_count
-            final_response["session_id"] = self.session_id
+        Runs the same pipeline but awaits the model through the pooled
+        AsyncModelProvider, so an event loop can serve many slow
+        generations without blocking a thread on each. Generations queue
+        in the same scheduler as the threaded path.
 
-            return final_response
+        Args:
+            state: Session to continue; updated in place
+            user_input: User's message
+            include_context: Whether to include conversation history
 
-        # Step 3: Generate model response (input passed moderation)
-        model_response = self._generate_response(
-            user_input,
-            include_context
-        )
+        Returns:
+            Dict with the same keys as process_message
+        """
+        start_time = time.time()
 
-        # Step 4: Moderate model output
+        disclaimer = self._take_disclaimer(state)
+
+        stage_start = time.perf_counter()
+        input_moderation = self._moderate_input(state, user_input)
+        timings = {"input_moderation_ms": elapsed_ms(stage_start)}
+        if input_moderation.action != ModerationAction.ALLOW:
+            return self._respond_without_model(
+                state, user_input, input_moderation, disclaimer, start_time,
+                timings)
+
+        generation_args, prompt_span = self._generation_args(
+            state, user_input, include_context)
+        model_response = await self._agenerate_response(generation_args)
+        if model_response.get("rejected"):
+            return self._reject_turn(
+                state, user_input, model_response, disclaimer, start_time,
+                timings)
+
+        stage_start = time.perf_counter()
         output_moderation = self._moderate_output(
-            user_input,
             model_response["response"]
         )
+        timings["output_moderation_ms"] = elapsed_ms(stage_start)
+
+        return self._finalize_turn(
+            state=state,
+            user_input=user_input,
+            model_response=model_response,
+            input_moderation=input_moderation,
+            output_moderation=output_moderation,
+            disclaimer=disclaimer,
+            start_time=start_time,
+            include_context=include_context,
+            prompt_span=prompt_span,
+            timings=timings,
+        )
+
+    @property
+    def async_model(self):
+        """Shared AsyncModelProvider, imported on first async use."""
+        from .async_model_provider import get_async_provider
+        return get_async_provider()
+
+    def _take_disclaimer(self, state: SessionState) -> Optional[str]:
+        """Return the disclaimer on the first interaction, None afterwards."""
+        if not state.first_interaction:
+            return None
+        state.first_interaction = False
+        # Get disclaimer to include in response
+        return self.moderator.get_disclaimer()
+
+    def _respond_without_model(
+        self,
+        state: SessionState,
+        user_input: str,
+        input_moderation: ModerationResult,
+        disclaimer: Optional[str],
+        start_time: float,
+        timings: Dict,
+    ) -> Dict:
+        """
+        Answer a turn whose input was blocked or redirected.
+
+        No model call and no output moderation happen: the response comes
+        from a prebuilt payload, and the reported latency covers detection
+        only.
+        """
+        latency_ms = int((time.time() - start_time) * 1000)
+        payload = self._fallback_payload(state, input_moderation, disclaimer)
+
+        stage_start = time.perf_counter()
+        self._update_history(state, user_input, payload["response"])
+        # The model never saw this turn, so its token context is stale; the
+        # turn still joins the history the next prompt shows
+        self._remember_context(state, payload, False, state.context_span)
+        timings["history_update_ms"] = elapsed_ms(stage_start)
+
+        result = {
+            "prompt": user_input,
+            "response": payload["response"],
+            "safety_action": payload["safety_action"],
+            "policy_tags": list(input_moderation.tags),
+            "model_name": payload["model"],
+            "deterministic": True,
+            "latency_ms": latency_ms,
+            "timings": self._turn_timings(timings, payload),
+            "turn_count": state.turn_count,
+            "session_id": state.session_id,
+        }
+        metrics.record_turn(result)
+        return result
+
+    def _reject_turn(
+        self,
+        state: SessionState,
+        user_input: str,
+        model_response: Dict,
+        disclaimer: Optional[str],
+        start_time: float,
+        timings: Dict,
+    ) -> Dict:
+        """
+        Answer a turn the model could not take, asking the user to retry.
+
+        The session is left as it was: nothing is added to history, the turn
+        does not count towards the limit, the disclaimer is still shown on
+        the next turn and the message leaves the escalation window. The
+        result is reported as an "error" with the rejection reason as tag.
+        """
+        if disclaimer:
+            state.first_interaction = True
+        state.escalation.undo()
+
+        result = {
+            "prompt": user_input,
+            "response": model_response["response"],
+            "safety_action": "error",
+            "policy_tags": [model_response["rejected"]],
+            "model_name": model_response["model"],
+            "deterministic": False,
+            "latency_ms": int((time.time() - start_time) * 1000),
+            "timings": self._turn_timings(timings, model_response),
+            "turn_count": state.turn_count,
+            "session_id": state.session_id,
+        }
+        metrics.record_turn(result)
+        return result
+
+    def _fallback_payload(
+        self,
+        state: SessionState,
+        input_moderation: ModerationResult,
+        disclaimer: Optional[str],
+    ) -> Mapping[str, str]:
+        """
+        Return the shared response payload for a blocked or redirected turn.
+
+        Payloads only depend on the fallback template, the disclaimer and the
+        conversation-limit note, so each combination is built once.
+        """
+        near_limit = state.turn_count >= MAX_CONVERSATION_TURNS - 2
+        key = (
+            input_moderation.action,
+            input_moderation.fallback_response,
+            disclaimer,
+            state.turn_count if near_limit else None,
+        )
+        payload = self._fallback_payloads.get(key)
+        if payload is not None:
+            return payload
+
+        if input_moderation.action == ModerationAction.BLOCK:
+            safety_action, model_name = "block", "blocked"
+            text = input_moderation.fallback_response or BLOCK_RESPONSE
+        else:
+            safety_action, model_name = "safe_fallback", "safe_fallback"
+            text = input_moderation.fallback_response or SAFE_FALLBACK_RESPONSE
+        if near_limit:
+            text += self._limit_note(state.turn_count)
+        if disclaimer:
+            text = f"{disclaimer}\n\n---\n\n{text}"
 
-        # Step 5: Prepare final response based on all moderation results
+        payload = MappingProxyType({
+            "response": text,
+            "safety_action": safety_action,
+            "model": model_name,
+        })
+        # Limit notes differ per turn, so stop caching long conversations
+        if len(self._fallback_payloads) < MAX_FALLBACK_PAYLOADS:
+            self._fallback_payloads[key] = payload
+        return payload
+
+    @staticmethod
+    def _limit_note(turn_count: int) -> str:
+        """Note appended to responses when the conversation nears its limit."""
+        return f"\n\n[Note: We're approaching our conversation limit ({turn_count + 1}/{MAX_CONVERSATION_TURNS} turns). Consider taking a break or starting a new conversation if needed.]"
+
+    def _finalize_turn(
+        self,
+        state: SessionState,
+        user_input: str,
+        model_response: Dict,
+        input_moderation: ModerationResult,
+        output_moderation: ModerationResult,
+        disclaimer: Optional[str],
+        start_time: float,
+        include_context: bool = True,
+        prompt_span: int = 0,
+        timings: Optional[Dict] = None,
+    ) -> Dict:
+        """Build the final response, record the turn and attach metadata."""
+        timings = timings if timings is not None else {}
         final_response = self._prepare_final_response(
+            state=state,
             user_input=user_input,
             model_response=model_response,
             input_moderation=input_moderation,
@@ -169,89 +544,222 @@ class ChatEngine:
         if disclaimer:
             final_response["response"] = f"{disclaimer}\n\n---\n\n{final_response['response']}"
 
-        # Step 6: Update conversation history
-        self._update_history(user_input, final_response["response"])
+        # A context from a call without history cannot continue this session
+        continues_history = include_context or not state.history
+
+        stage_start = time.perf_counter()
+        self._update_history(state, user_input, final_response["response"])
+        self._remember_context(
+            state,
+            model_response,
+            final_response["safety_action"] == "allow" and continues_history,
+            prompt_span if continues_history else state.context_span,
+        )
+        timings["history_update_ms"] = elapsed_ms(stage_start)
 
-        # Step 7: Add metadata
         final_response["latency_ms"] = int((time.time() - start_time) * 1000)
-        final_response["turn_count"] = self.turn_count
-        final_response["session_id"] = self.session_id
+        final_response["timings"] = self._turn_timings(timings, model_response)
+        final_response["turn_count"] = state.turn_count
+        final_response["session_id"] = state.session_id
 
+        metrics.record_turn(final_response)
         return final_response
 
-    def _moderate_input(self, user_input: str) -> ModerationResult:
+    @staticmethod
+    def _turn_timings(stage_timings: Dict, model_response: Mapping) -> Dict:
+        """Merge pipeline and provider timings into one record (TIMING_KEYS order)."""
+        merged = dict(stage_timings)
+        merged.update(model_response.get("timings", {}))
+        return {key: merged.get(key, 0) for key in TIMING_KEYS}
+
+    def _moderate_input(
+        self,
+        state: SessionState,
+        user_input: str,
+    ) -> ModerationResult:
         """
         Implement input moderation.
 
         - Calls moderator with user input
-        - Considers conversation context
+        - Considers conversation context through the session's running
+          escalation state, which the moderator updates with this message
         - Returns moderation result
         """
-        # Get relevant context from conversation history
-        context = self.conversation_history[-CONTEXT_WINDOW_SIZE:] \
-            if self.conversation_history else None
-
         return self.moderator.moderate(
             user_prompt=user_input,
-            context=context,
+            escalation=state.escalation,
         )
 
-    def _generate_response(
-        self,
-        user_input: str,
-        include_context: bool,
-    ) -> Dict:
+    def _generate_response(self, generation_args: Dict) -> Dict:
         """
         Generate model response with appropriate prompting.
 
-        - Builds prompt with system instructions
-        - Includes relevant context
+        - Sends the prompt chosen by _generation_args (system instructions
+          and relevant context, or a continuation of the model context)
         - Calls model provider
         - Handles errors gracefully
         """
         try:
-            context = None
-            if include_context and self.conversation_history:
-                # Prepare context (last N turns)
-                context = self.conversation_history[-CONTEXT_WINDOW_SIZE:]
-
-            response = self.model.generate(
-                prompt=user_input,
-                system_prompt=SYSTEM_PROMPT,
-                conversation_history=context,
-            )
+            response = self.model.generate(**generation_args)
 
             return response
 
         except Exception as e:
             logger.error(f"Model generation failed: {e}")
-            # Return appropriate error response
+            return self._generation_error(e)
+
+    async def _agenerate_response(self, generation_args: Dict) -> Dict:
+        """Asyncio counterpart of _generate_response."""
+        try:
+            return await self.async_model.generate(**generation_args)
+
+        except Exception as e:
+            logger.error(f"Model generation failed: {e}")
+            return self._generation_error(e)
+
+    def _generate_response_stream(self, generation_args: Dict) -> Iterator[Dict]:
+        """
+        Streaming counterpart of _generate_response.
+
+        Yields the provider's token chunks followed by a final dict with
+        "done" set. Errors become the same apology response as the
+        non-streaming path.
+        """
+        try:
+            yield from self.model.generate_stream(**generation_args)
+        except Exception as e:
+            logger.error(f"Model generation failed: {e}")
+            error_response = self._generation_error(e)
+            error_response["done"] = True
+            yield error_response
+
+    def _remember_context(
+        self,
+        state: SessionState,
+        model_response: Dict,
+        reusable: bool,
+        prompt_span: int,
+    ):
+        """
+        Advance the history window the model sees, and keep or drop its context.
+
+        The window grows by one turn at a time while it fits in the retained
+        history (SessionState.MAX_HISTORY_SIZE messages). Once it would not,
+        it slides back to the last CONTEXT_WINDOW_SIZE messages. Follow-ups
+        continue from Ollama's token context, and a rebuilt prompt sends the
+        same window as text, so the model sees the same history on either
+        path. The context returned by a rebuilt prompt is kept as well, so
+        reuse resumes on the turn after a rebuild.
+
+        The context is only kept when the model's own reply was used; a
+        fallback or error means the next turn rebuilds the same window.
+        """
+        span = prompt_span + 2
+        if span > SessionState.MAX_HISTORY_SIZE:
+            state.model_context = None
+            state.context_span = CONTEXT_WINDOW_SIZE
+            return
+
+        state.context_span = span
+        context = model_response.get("context")
+        if reusable and context and "error" not in model_response:
+            state.model_context = context
+        else:
+            state.model_context = None
+
+    def _generation_args(
+        self,
+        state: SessionState,
+        user_input: str,
+        include_context: bool,
+    ) -> Tuple[Dict, int]:
+        """
+        Choose how the prompt is sent to the model.
+
+        Follow-ups continue from the stored Ollama context and send only the
+        new user turn; otherwise the system prompt and the history window
+        chosen by _remember_context are rendered again.
+
+        Returns:
+            Keyword arguments for the provider, and the number of history
+            messages the model will have seen once this prompt is sent
+        """
+        # Continuing grows the model context every turn; once it would pass
+        # the prompt budget, rebuild a bounded prompt from history instead
+        if (include_context and state.model_context
+                and len(state.model_context) + estimate_tokens(user_input)
+                <= PROMPT_TOKEN_BUDGET):
+            return (
+                {
+                    "prompt": user_input,
+                    "context": state.model_context,
+                    "session_id": state.session_id,
+                },
+                state.context_span,
+            )
+
+        context = None
+        if include_context and state.history:
+            # Prepare context (the current history window)
+            context = state.recent(state.context_span or CONTEXT_WINDOW_SIZE)
+
+        return (
+            {
+                "prompt": user_input,
+                "system_prompt": SYSTEM_PROMPT,
+                "conversation_history": context,
+                "session_id": state.session_id,
+            },
+            len(context) if context else 0,
+        )
+
+    @staticmethod
+    def _generation_error(error: Exception) -> Dict:
+        """
+        Build the response used when model generation fails.
+
+        Requests the model never took carry a "rejected" reason and are
+        answered by _reject_turn without touching the session.
+        """
+        if isinstance(error, SchedulerBusy):
             return {
-                "response": "I apologize, but I'm having trouble processing your message. Please try again.",
-                "error": str(e),
-                "model": "error",
+                "response": BUSY_RESPONSE,
+                "error": str(error),
+                "model": "busy",
+                "rejected": "busy",
                 "deterministic": False,
             }
+        if isinstance(error, ModelUnavailable):
+            metrics.MODEL_ERRORS.inc(kind="unavailable")
+            return {
+                "response": WARMING_UP_RESPONSE,
+                "error": str(error),
+                "model": "unavailable",
+                "rejected": "model_unavailable",
+                "deterministic": False,
+            }
+        metrics.record_model_error(error)
+        return {
+            "response": "I apologize, but I'm having trouble processing your message. Please try again.",
+            "error": str(error),
+            "model": "error",
+            "deterministic": False,
+        }
 
-    def _moderate_output(
-        self,
-        user_input: str,
-        model_response: str,
-    ) -> ModerationResult:
+    def _moderate_output(self, model_response: str) -> ModerationResult:
         """
         Implement output moderation.
 
         - Checks model response for policy violations
-        - Considers user input for context
+        - Skips input checks, the user prompt was already cleared by
+          _moderate_input
         - Returns moderation result
         """
-        return self.moderator.moderate(
-            user_prompt=user_input,
-            model_response=model_response,
-        )
+        return self.moderator.moderate_output(model_response)
 
     def _prepare_final_response(
         self,
+        state: SessionState,
         user_input: str,
         model_response: Dict,
         input_moderation: ModerationResult,
@@ -267,13 +775,11 @@ class ChatEngine:
         # Determine final action and response based on moderation results
         if input_moderation.action == ModerationAction.BLOCK:
             final_action = "block"
-            final_text = input_moderation.fallback_response or \
-                "I cannot assist with that request. If you have other questions or need support with appropriate topics, I'm here to help."
+            final_text = input_moderation.fallback_response or BLOCK_RESPONSE
             policy_tags = input_moderation.tags
         elif input_moderation.action == ModerationAction.SAFE_FALLBACK:
             final_action = "safe_fallback"
-            final_text = input_moderation.fallback_response or \
-                "Let me redirect you to appropriate resources. If you're in crisis, please contact emergency services or a crisis helpline immediately."
+            final_text = input_moderation.fallback_response or SAFE_FALLBACK_RESPONSE
             policy_tags = input_moderation.tags
         elif output_moderation.action == ModerationAction.SAFE_FALLBACK:
             final_action = "safe_fallback"
@@ -287,8 +793,8 @@ class ChatEngine:
             policy_tags = []
 
         # Check if we need to add conversation length warning
-        if self.turn_count >= MAX_CONVERSATION_TURNS - 2:
-            final_text += f"\n\n[Note: We're approaching our conversation limit ({self.turn_count + 1}/{MAX_CONVERSATION_TURNS} turns). Consider taking a break or starting a new conversation if needed.]"
+        if state.turn_count >= MAX_CONVERSATION_TURNS - 2:
+            final_text += self._limit_note(state.turn_count)
 
         return {
             "prompt": user_input,
@@ -299,7 +805,12 @@ class ChatEngine:
             "deterministic": model_response.get("deterministic", False),
         }
 
-    def _update_history(self, user_input: str, assistant_response: str):
+    def _update_history(
+        self,
+        state: SessionState,
+        user_input: str,
+        assistant_response: str,
+    ):
         """
         Update conversation history.
 
@@ -311,55 +822,186 @@ class ChatEngine:
         - Check and handle conversation limits
         - Maintain maximum history size
         """
+        history = state.history
+
         # Add user message
-        self.conversation_history.append({
+        history.append({
             "role": "user",
             "content": user_input,
         })
 
         # Add assistant response
-        self.conversation_history.append({
+        history.append({
             "role": "assistant",
             "content": assistant_response,
         })
 
         # Increment turn counter
-        self.turn_count += 1
+        state.turn_count += 1
 
-        if self.turn_count >= MAX_CONVERSATION_TURNS:
+        if state.turn_count >= MAX_CONVERSATION_TURNS:
             limit_message = (
                 "We've reached the maximum number of turns for this session. "
                 "Let's pause here—consider taking a break or starting a new conversation if you need more support."
             )
-            if not self.conversation_history or self.conversation_history[-1].get("content") != limit_message:
-                self.conversation_history.append({
+            if not history or history[-1].get("content") != limit_message:
+                history.append({
                     "role": "system",
                     "content": limit_message,
                 })
 
-        # Optional: Trim history if it exceeds window size (already implemented)
-        max_history_size = CONTEXT_WINDOW_SIZE * 2  # Each turn has 2 messages
-        if len(self.conversation_history) > max_history_size:
-            # Keep the most recent messages
-            self.conversation_history = self.conversation_history[-max_history_size:]
+        # History is a ring buffer of CONTEXT_WINDOW_SIZE * 2 messages, so the
+        # oldest messages are already dropped as new ones are appended
+
+
+class ChatEngine:
+    """
+    Single-conversation wrapper around the shared ChatPipeline.
+
+    Keeps one SessionState and forwards to the pipeline, for callers such as
+    scripts/evaluate.py that drive one conversation at a time.
+    """
+
+    def __init__(
+        self,
+        state: Optional[SessionState] = None,
+        pipeline: Optional[ChatPipeline] = None,
+    ):
+        """
+        Initialize chat engine.
+
+        Args:
+            state: Session to continue; a fresh one is created if omitted
+            pipeline: Pipeline to use; the shared one if omitted
+        """
+        self.pipeline = pipeline or get_pipeline()
+        self.state = state or SessionState()
+
+    @property
+    def model(self):
+        """Shared model provider."""
+        return self.pipeline.model
+
+    @property
+    def moderator(self):
+        """Shared moderator."""
+        return self.pipeline.moderator
+
+    @property
+    def conversation_history(self) -> List[Dict]:
+        """Copy of this session's recent messages."""
+        return list(self.state.history)
+
+    @property
+    def turn_count(self) -> int:
+        """Number of completed turns."""
+        return self.state.turn_count
+
+    @property
+    def session_id(self) -> str:
+        """Identifier of the current session."""
+        return self.state.session_id
+
+    @property
+    def model_context(self) -> Optional[List[int]]:
+        """Ollama context kept for the next turn, if any."""
+        return self.state.model_context
+
+    def process_message(
+        self,
+        user_input: str,
+        include_context: bool = True,
+    ) -> Dict:
+        """Process a message; see ChatPipeline.process_message."""
+        return self.pipeline.process_message(
+            self.state, user_input, include_context)
+
+    def process_message_stream(
+        self,
+        user_input: str,
+        include_context: bool = True,
+    ) -> Iterator[Dict]:
+        """Stream a reply; see ChatPipeline.process_message_stream."""
+        return self.pipeline.process_message_stream(
+            self.state, user_input, include_context)
+
+    async def aprocess_message(
+        self,
+        user_input: str,
+        include_context: bool = True,
+    ) -> Dict:
+        """Process a message on asyncio; see ChatPipeline.aprocess_message."""
+        return await self.pipeline.aprocess_message(
+            self.state, user_input, include_context)
 
     def reset(self):
         """Reset conversation state."""
-        self.conversation_history = []
-        self.turn_count = 0
-        self.first_interaction = True
-        self.session_id = f"session_{int(time.time())}"
+        self.state.reset()
         logger.info(f"Chat engine reset. New session: {self.session_id}")
 
 
-# Singleton instance
+# Singleton instances
+_pipeline_instance = None
 _engine_instance = None
+_singleton_lock = threading.RLock()
+
+
+def get_pipeline() -> ChatPipeline:
+    """Get or create the shared pipeline instance."""
+    global _pipeline_instance
+    if _pipeline_instance is None:
+        with _singleton_lock:
+            if _pipeline_instance is None:
+                _pipeline_instance = ChatPipeline()
+                logger.info("Created shared ChatPipeline instance")
+    return _pipeline_instance
 
 
 def get_engine() -> ChatEngine:
     """Get or create singleton chat engine instance."""
     global _engine_instance
     if _engine_instance is None:
-        _engine_instance = ChatEngine()
-        logger.info("Created new ChatEngine singleton instance")
+        with _singleton_lock:
+            if _engine_instance is None:
+                _engine_instance = ChatEngine()
+                logger.info("Created new ChatEngine singleton instance")
     return _engine_instance
+
+
+def preload(freeze: bool = False) -> Dict[str, float]:
+    """
+    Build the shared pipeline ahead of the first request.
+
+    Compiles the moderation tables and creates the model provider without
+    starting its background threads or connecting to Ollama, so a pre-fork
+    server master can call it once and its workers share the result
+    copy-on-write. Safe to call from several threads; later calls only
+    report timings.
+
+    Args:
+        freeze: Move every object allocated so far to the permanent GC
+            generation (gc.freeze), so collections in forked workers do not
+            write to, and thereby copy, the shared pages
+
+    Returns:
+        Milliseconds spent on the moderator, the pipeline and in total
+    """
+    start_time = time.perf_counter()
+    get_moderator()
+    timings = {"moderator_ms": elapsed_ms(start_time)}
+
+    stage_start = time.perf_counter()
+    get_pipeline()
+    timings["pipeline_ms"] = elapsed_ms(stage_start)
+
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    timings["total_ms"] = elapsed_ms(start_time)
+
+    logger.info(
+        f"Preloaded chat pipeline in {timings['total_ms']:.1f} ms "
+        f"(moderator {timings['moderator_ms']:.1f} ms, "
+        f"pipeline {timings['pipeline_ms']:.1f} ms)"
+    )
+    return timings
@@ -92,6 +92,66 @@ SAFETY_MODE: Literal["strict", "balanced", "permissive"] = "balanced"
 
 MAX_CONVERSATION_TURNS = 10  # Maximum turns before suggesting break
 CONTEXT_WINDOW_SIZE = 5  # How many previous turns to include in context
+# Estimated tokens per rendered prompt; with MAX_TOKENS this fits Ollama's
+# default 2048-token context. Older turns are compressed or dropped first.
+PROMPT_TOKEN_BUDGET = 1536
+
+# Escalation: crisis keyword hits summed over the last user turns of a session.
+# Tracked incrementally, so the window may reach past CONTEXT_WINDOW_SIZE.
+ESCALATION_WINDOW_TURNS = 2  # Previous user turns counted
+ESCALATION_THRESHOLD = 3  # Hits within the window that trigger the fallback
+
+# Typo-tolerant matching of canonical crisis/medical terms (0 disables)
+FUZZY_MATCH_DISTANCE = 1  # Max edits (incl. transpositions) from a term
+FUZZY_MATCH_MIN_LENGTH = 5  # Shorter words are only matched exactly
+# English words near the terms; tokens an ordinary word explains as well are
+# not matched. Regenerate with scripts/build_fuzzy_wordlist.py.
+FUZZY_WORDLIST_FILE = os.path.join(BASE_DIR, "src", "data", "fuzzy_wordlist.txt")
+
+# Offline moderation (Moderator.moderate_batch / scripts/audit.py)
+MODERATION_BATCH_SIZE = 512  # Messages handed to a worker process at a time
+
+# Streaming: trailing characters of model output re-moderated after each token
+STREAM_MODERATION_WINDOW = 400
+
+# Async provider connection pool
+# Open connections to Ollama per event loop; generations are still limited
+# to GENERATION_MAX_CONCURRENCY by the shared scheduler
+ASYNC_MAX_CONNECTIONS = 16
+ASYNC_KEEPALIVE_SECONDS = 30  # Idle time before pooled connections close
+
+# Web session store: "memory" (per process) or "sqlite" (shared, persistent)
+SESSION_STORE_BACKEND = os.environ.get("CHATBOT_SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.environ.get(
+    "CHATBOT_SESSION_DB", os.path.join(BASE_DIR, "sessions.sqlite3"))
+SESSION_STORE_MAX_SIZE = 10000  # Sessions kept before evicting the least recent
+SESSION_IDLE_TTL_SECONDS = 30 * 60  # Sessions idle longer than this expire
+
+# Deterministic response cache, bypassed whenever TEMPERATURE != 0
+RESPONSE_CACHE_SIZE = 1024  # Responses kept in memory (0 disables the cache)
+# Optional SQLite file so cached responses survive restarts and repeated eval runs
+RESPONSE_CACHE_PATH = os.environ.get("CHATBOT_RESPONSE_CACHE_DB") or None
+
+# Generation scheduler in front of Ollama
+# Concurrent generations; match the Ollama server's OLLAMA_NUM_PARALLEL
+GENERATION_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+GENERATION_QUEUE_SIZE = 32  # Waiting generations before new ones are rejected as busy
+GENERATION_QUEUE_TIMEOUT_SECONDS = 60  # Longest wait for a generation slot
+
+# Background Ollama health monitoring
+HEALTH_CHECK_INTERVAL_SECONDS = 15  # Poll interval while the model is available
+HEALTH_RETRY_SECONDS = 2  # Poll interval while Ollama is down or the model is missing
+
+# Ollama model residency: how long the model stays loaded after a request
+# ("30m", "1h", or seconds; -1 keeps it loaded until Ollama stops)
+_keep_alive = os.environ.get("CHATBOT_KEEP_ALIVE", "30m")
+MODEL_KEEP_ALIVE = int(_keep_alive) if _keep_alive.lstrip("-").isdigit() else _keep_alive
+KEEP_ALIVE_PING_SECONDS = 5 * 60  # Re-ping interval while sessions are active
+KEEP_ALIVE_SLOT_TIMEOUT_SECONDS = 1  # Wait for a generation slot before a warm-up or ping is skipped
+
+# Set when the app is imported by a pre-fork server master (e.g. gunicorn
+# --preload): background threads then start in each worker after fork
+PREFORK_SERVER = os.environ.get("CHATBOT_PREFORK", "0") == "1"
 
 CUSTOM_CONFIG = {
     "empathy_level": "high",
@@ -125,6 +185,18 @@ def validate_config():
     assert 0 <= TEMPERATURE <= 1, f"Invalid TEMPERATURE: {TEMPERATURE}"
     assert 1 <= MAX_CONVERSATION_TURNS <= 50, \
         f"Invalid MAX_CONVERSATION_TURNS: {MAX_CONVERSATION_TURNS}"
+    assert GENERATION_MAX_CONCURRENCY >= 1, \
+        f"Invalid GENERATION_MAX_CONCURRENCY: {GENERATION_MAX_CONCURRENCY}"
+    assert PROMPT_TOKEN_BUDGET >= 256, \
+        f"Invalid PROMPT_TOKEN_BUDGET: {PROMPT_TOKEN_BUDGET}"
+    assert ESCALATION_WINDOW_TURNS >= 1, \
+        f"Invalid ESCALATION_WINDOW_TURNS: {ESCALATION_WINDOW_TURNS}"
+    # The shipped word list covers words up to two edits from a term, which
+    # settles every tie at one edit
+    assert 0 <= FUZZY_MATCH_DISTANCE <= 1, \
+        f"Invalid FUZZY_MATCH_DISTANCE: {FUZZY_MATCH_DISTANCE}"
+    assert SESSION_STORE_BACKEND in ["memory", "sqlite"], \
+        f"Invalid SESSION_STORE_BACKEND: {SESSION_STORE_BACKEND}"
 
 
 # Run validation on import
@@ -6,23 +6,25 @@ This module is complete - students should NOT modify.
 import json
 import logging
 import os
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 import jsonschema
 
 logger = logging.getLogger(__name__)
 
 
-def read_jsonl(filepath: str) -> List[Dict]:
+def iter_jsonl(filepath: str) -> Iterator[Dict]:
     """
-    Read JSONL file and return list of dictionaries.
+    Lazily read a JSONL file one record at a time.
     
     Args:
         filepath: Path to JSONL file
         
-    Returns:
-        List of parsed JSON objects
+    Yields:
+        Parsed JSON objects, in file order
         
     Raises:
         FileNotFoundError: If file doesn't exist
@@ -31,18 +33,33 @@ def read_jsonl(filepath: str) -> List[Dict]:
     if not os.path.exists(filepath):
         raise FileNotFoundError(f"File not found: {filepath}")
     
-    records = []
     with open(filepath, 'r', encoding='utf-8') as f:
         for line_num, line in enumerate(f, 1):
             line = line.strip()
             if not line:
                 continue
             try:
-                records.append(json.loads(line))
+                yield json.loads(line)
             except json.JSONDecodeError as e:
                 logger.error(f"Invalid JSON at line {line_num}: {e}")
                 raise
+
+
+def read_jsonl(filepath: str) -> List[Dict]:
+    """
+    Read JSONL file and return list of dictionaries.
     
+    Args:
+        filepath: Path to JSONL file
+        
+    Returns:
+        List of parsed JSON objects
+        
+    Raises:
+        FileNotFoundError: If file doesn't exist
+        json.JSONDecodeError: If JSON is invalid
+    """
+    records = list(iter_jsonl(filepath))
     logger.info(f"Read {len(records)} records from {filepath}")
     return records
 
@@ -55,14 +72,106 @@ def write_jsonl(records: List[Dict], filepath: str):
         records: List of dictionaries to write
         filepath: Output file path
     """
-    # Create directory if it doesn't exist
-    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
-    
-    with open(filepath, 'w', encoding='utf-8') as f:
+    with JsonlWriter(filepath, append=False) as writer:
         for record in records:
-            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            writer.write(record)
+    
+    logger.info(f"Wrote {writer.count} records to {filepath}")
+
+
+class JsonlWriter:
+    """
+    Incremental JSONL writer that makes every record durable as it goes.
+    
+    Each record is flushed to the OS as soon as it is written, and optionally
+    fsynced every ``fsync_every`` records, so a crash loses at most the
+    records since the last sync. In append mode a partial last line left by
+    an earlier crash is dropped before writing.
+    
+    Usage:
+        with JsonlWriter(path) as writer:
+            writer.write(record)
+    """
+    
+    def __init__(self, filepath: str, append: bool = True, fsync_every: int = 0):
+        """
+        Open the output file.
+        
+        Args:
+            filepath: Output file path
+            append: Keep existing records instead of truncating the file
+            fsync_every: Fsync after this many records (0 disables fsync)
+        """
+        # Create directory if it doesn't exist
+        os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+        
+        self.filepath = filepath
+        self.fsync_every = fsync_every
+        self.count = 0
+        self._unsynced = 0
+        
+        if append:
+            _drop_partial_line(filepath)
+        self._file = open(filepath, 'a' if append else 'w', encoding='utf-8')
+    
+    def write(self, record: Dict):
+        """Append one record and flush it."""
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        self.count += 1
+        self._unsynced += 1
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            self.sync()
+    
+    def sync(self):
+        """Force written records to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+    
+    def close(self):
+        """Sync outstanding records (if fsync is enabled) and close the file."""
+        if self._file.closed:
+            return
+        if self.fsync_every and self._unsynced:
+            self.sync()
+        self._file.close()
+    
+    def __enter__(self) -> "JsonlWriter":
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _drop_partial_line(filepath: str):
+    """Truncate a file after its last newline, discarding an unfinished record."""
+    if not os.path.exists(filepath):
+        return
     
-    logger.info(f"Wrote {len(records)} records to {filepath}")
+    with open(filepath, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        
+        # Scan backwards in blocks for the last complete line
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            f.seek(start)
+            block = f.read(end - start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                f.truncate(start + newline + 1)
+                break
+            end = start
+        else:
+            f.truncate(0)
+    
+    logger.warning(f"Dropped incomplete trailing record from {filepath}")
 
 
 def load_schema(schema_path: str) -> Dict:
@@ -88,6 +197,72 @@ def load_schema(schema_path: str) -> Dict:
     return schema
 
 
+# Prepared validators, so each schema is checked and compiled once instead of
+# on every record. Lookups go by the schema object's id first; the entry holds
+# the schema, so the id cannot be reused by another object while cached. An
+# equal schema loaded again shares the validator through its canonical text.
+VALIDATOR_CACHE_SIZE = 16
+_validators_by_id: "OrderedDict[int, Tuple[Dict, Any]]" = OrderedDict()
+_validators_by_text: "OrderedDict[str, Any]" = OrderedDict()
+_validator_lock = threading.Lock()
+
+
+def _lookup(cache: OrderedDict, key):
+    """Return a cached value and mark it recently used, or None."""
+    value = cache.get(key)
+    if value is not None:
+        cache.move_to_end(key)
+    return value
+
+
+def _remember(cache: OrderedDict, key, value):
+    """Cache a value, evicting the least recently used beyond VALIDATOR_CACHE_SIZE."""
+    cache[key] = value
+    cache.move_to_end(key)
+    if len(cache) > VALIDATOR_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def get_validator(schema: Dict):
+    """
+    Return a prepared validator for a schema, building it on first use.
+    
+    A schema must not be modified once it has been used: the same object
+    keeps getting the validator built for its first content.
+    
+    Args:
+        schema: JSON schema
+        
+    Returns:
+        jsonschema validator instance for the schema's draft
+        
+    Raises:
+        jsonschema.exceptions.SchemaError: If the schema is invalid
+    """
+    with _validator_lock:
+        entry = _lookup(_validators_by_id, id(schema))
+    if entry is not None:
+        return entry[1]
+    
+    key = json.dumps(schema, sort_keys=True)
+    with _validator_lock:
+        validator = _lookup(_validators_by_text, key)
+    if validator is None:
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        validator = cls(schema)
+    
+    with _validator_lock:
+        _remember(_validators_by_text, key, validator)
+        _remember(_validators_by_id, id(schema), (schema, validator))
+    return validator
+
+
+def _first_error(validator, record: Dict):
+    """Return the error jsonschema.validate would raise for a record, if any."""
+    return jsonschema.exceptions.best_match(validator.iter_errors(record))
+
+
 def validate_record(record: Dict, schema: Dict) -> bool:
     """
     Validate a record against JSON schema.
@@ -100,14 +275,42 @@ def validate_record(record: Dict, schema: Dict) -> bool:
         True if valid, False otherwise
     """
     try:
-        jsonschema.validate(instance=record, schema=schema)
-        return True
-    except jsonschema.exceptions.ValidationError as e:
-        logger.error(f"Schema validation failed: {e.message}")
-        return False
+        validator = get_validator(schema)
     except jsonschema.exceptions.SchemaError as e:
         logger.error(f"Schema is invalid: {e.message}")
         raise
+    
+    error = _first_error(validator, record)
+    if error is not None:
+        logger.error(f"Schema validation failed: {error.message}")
+        return False
+    return True
+
+
+def validate_records(records: Iterable[Dict], schema: Dict) -> List[Tuple[int, str]]:
+    """
+    Validate many records against one JSON schema in a single pass.
+    
+    Args:
+        records: Dictionaries to validate
+        schema: JSON schema
+        
+    Returns:
+        List of (record index, error message) for every invalid record
+        
+    Raises:
+        jsonschema.exceptions.SchemaError: If the schema is invalid
+    """
+    validator = get_validator(schema)
+    failures = []
+    for index, record in enumerate(records):
+        error = _first_error(validator, record)
+        if error is not None:
+            failures.append((index, error.message))
+    
+    if failures:
+        logger.error(f"Schema validation failed for {len(failures)} records")
+    return failures
 
 
 def ensure_path(path: str) -> Path:
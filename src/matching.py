@@ -0,0 +1,552 @@
+"""
+Text matching primitives used by the moderation pipeline.
+Keyword tables and regex lists are compiled once so that every message is
+scanned in a single pass regardless of how many rules are configured.
+"""
+
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+# Typographic apostrophes unified with "'"; invisible characters dropped
+_CHARACTER_TABLE = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u02bc": "'", "\u00b4": "'", "`": "'",
+    "\u00ad": None, "\u200b": None, "\u200c": None, "\u200d": None,
+    "\u2060": None, "\ufeff": None,
+})
+# Look-alike digits and symbols, applied only inside words containing letters
+_LEET_TABLE = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t",
+    "@": "a", "$": "s", "!": "i", "|": "l",
+})
+_LEET_WORD = re.compile(r"(?:[\w@$]|[!|](?=\w))+")
+_LEET_CHARS = frozenset("013457@$!|")
+_QUANTITY = re.compile(r"\d+[a-z]{0,2}")  # "20mg", "3rd": left alone
+_LETTER = re.compile(r"[a-z]")
+# Three or more single letters separated by spaces or punctuation ("k y s")
+_SPACED_LETTERS = re.compile(r"\b[a-z](?:[ .\-_*]{1,2}[a-z]\b){2,}")
+_SEPARATOR = re.compile(r"[ .\-_*]+")
+_TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+
+def _deleet(match: re.Match) -> str:
+    """Replace look-alike characters in one word ("su1cide" -> "suicide")."""
+    word = match.group()
+    if (_LEET_CHARS.isdisjoint(word) or not _LETTER.search(word)
+            or _QUANTITY.fullmatch(word)):
+        return word
+    return word.translate(_LEET_TABLE)
+
+
+def _join_letters(match: re.Match) -> str:
+    """
+    Join a run of spaced-out letters.
+
+    The most common separator joins letters; any other separator is kept as
+    a word break, so "k.i.l.l m.y.s.e.l.f" becomes "kill myself".
+    """
+    run = match.group()
+    separators = _SEPARATOR.findall(run)
+    joiner = max(set(separators), key=separators.count)
+    return " ".join(
+        "".join(_SEPARATOR.split(word)) for word in _split_on_breaks(run, joiner))
+
+
+def _split_on_breaks(run: str, joiner: str) -> List[str]:
+    """Split a letter run at every separator other than ``joiner``."""
+    words, start = [], 0
+    for separator in _SEPARATOR.finditer(run):
+        if separator.group() != joiner:
+            words.append(run[start:separator.start()])
+            start = separator.end()
+    words.append(run[start:])
+    return words
+
+
+class NormalizedText:
+    """
+    Normalized views of one message, computed once and shared by all checks.
+
+    ``lower`` is the plain lowercase text the keyword and pattern rules were
+    written against. ``text`` is additionally NFKC-normalized and casefolded,
+    with typographic apostrophes unified, invisible characters removed,
+    look-alike digits inside words replaced ("su1cide"), spaced-out letters
+    joined ("k y s") and whitespace collapsed. Checks match both, so clean
+    input gives the same hits as before and obfuscated input gains recall.
+    """
+
+    __slots__ = ("raw", "lower", "text", "variants", "_tokens")
+
+    def __init__(self, raw: str):
+        """
+        Normalize a message.
+
+        Args:
+            raw: Text as received
+        """
+        self.raw = raw
+        self.lower = raw.lower()
+
+        # Each step is skipped when it cannot change the text
+        if raw.isascii():
+            text = self.lower
+            if "`" in text:
+                text = text.translate(_CHARACTER_TABLE)
+        else:
+            text = unicodedata.normalize("NFKC", raw).casefold()
+            text = text.translate(_CHARACTER_TABLE)
+        if not _LEET_CHARS.isdisjoint(text):
+            text = _LEET_WORD.sub(_deleet, text)
+        text = _SPACED_LETTERS.sub(_join_letters, text)
+        self.text = " ".join(text.split())
+
+        # Distinct texts to match rules against
+        self.variants: Tuple[str, ...] = (self.lower,) \
+            if self.text == self.lower else (self.lower, self.text)
+        self._tokens: Optional[List[str]] = None
+
+    @property
+    def tokens(self) -> List[str]:
+        """Words of the normalized text (apostrophes kept inside words)."""
+        if self._tokens is None:
+            self._tokens = _TOKEN.findall(self.text)
+        return self._tokens
+
+    def __bool__(self) -> bool:
+        """False for empty or whitespace-only messages."""
+        return bool(self.text)
+
+    def __str__(self) -> str:
+        return self.raw
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over a set of labelled keyword tables.
+
+    Each keyword may belong to several groups (e.g. the crisis list and a
+    harmful category). ``find`` reports, per group, the keywords that occur
+    anywhere in the text as a substring, in the order they were declared,
+    which matches the result of ``[kw for kw in keywords if kw in text]``.
+    """
+
+    def __init__(self, groups: Dict[Hashable, Iterable[str]]):
+        """
+        Compile the automaton.
+
+        Args:
+            groups: Mapping of group label to its ordered keyword list
+        """
+        self._keywords: List[str] = []
+        # keyword id -> [(group, position in that group's list)]
+        self._labels: List[List[Tuple[Hashable, int]]] = []
+        keyword_ids: Dict[str, int] = {}
+
+        for group, keywords in groups.items():
+            for position, keyword in enumerate(keywords):
+                if not keyword:
+                    continue
+                keyword_id = keyword_ids.get(keyword)
+                if keyword_id is None:
+                    keyword_id = len(self._keywords)
+                    keyword_ids[keyword] = keyword_id
+                    self._keywords.append(keyword)
+                    self._labels.append([])
+                self._labels[keyword_id].append((group, position))
+
+        self.groups = list(groups)
+        self._transitions, self._outputs = self._build(self._keywords)
+
+    @staticmethod
+    def _build(keywords: List[str]) -> Tuple[List[Dict[str, int]], List[Tuple[int, ...]]]:
+        """Build the trie, failure links and the fully resolved transition table."""
+        goto: List[Dict[str, int]] = [{}]
+        outputs: List[List[int]] = [[]]
+
+        for keyword_id, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(keyword_id)
+
+        # Breadth-first pass: resolve failure links and turn the trie into a
+        # DFA so scanning needs exactly one dict lookup per character.
+        # Characters that never appear in a keyword fall back to the root.
+        fail = [0] * len(goto)
+        transitions: List[Dict[str, int]] = [dict(goto[0])]
+        transitions.extend({} for _ in range(len(goto) - 1))
+        queue = deque(goto[0].values())
+
+        while queue:
+            state = queue.popleft()
+            fallback = fail[state]
+            outputs[state].extend(outputs[fallback])
+            resolved = dict(transitions[fallback])
+            for char, child in goto[state].items():
+                fail[child] = transitions[fallback].get(char, 0)
+                resolved[char] = child
+                queue.append(child)
+            transitions[state] = resolved
+
+        return transitions, [tuple(out) for out in outputs]
+
+    def scan(self, *texts: str) -> List[int]:
+        """
+        Return the ids of all distinct keywords contained in any of ``texts``.
+
+        Args:
+            texts: Texts to scan (callers are expected to lowercase them)
+
+        Returns:
+            Sorted keyword ids
+        """
+        transitions = self._transitions
+        outputs = self._outputs
+        found = set()
+
+        for text in texts:
+            state = 0
+            for char in text:
+                state = transitions[state].get(char, 0)
+                if outputs[state]:
+                    found.update(outputs[state])
+
+        return sorted(found)
+
+    def find(self, *texts: str) -> Dict[Hashable, List[str]]:
+        """
+        Find keyword hits for every group in a single pass per text.
+
+        Args:
+            texts: Texts to scan (callers are expected to lowercase them);
+                hits of all texts are merged
+
+        Returns:
+            Mapping of group label to the keywords found, in declaration order.
+            Groups without hits map to an empty list.
+        """
+        positioned: Dict[Hashable, List[Tuple[int, str]]] = {
+            group: [] for group in self.groups
+        }
+        for keyword_id in self.scan(*texts):
+            keyword = self._keywords[keyword_id]
+            for group, position in self._labels[keyword_id]:
+                positioned[group].append((position, keyword))
+
+        return {
+            group: [keyword for _, keyword in sorted(hits)]
+            for group, hits in positioned.items()
+        }
+
+    def count(self, text: str, group: Hashable) -> int:
+        """
+        Count the distinct keywords of one group contained in ``text``.
+
+        Args:
+            text: Text to scan (callers are expected to lowercase it)
+            group: Group label to count
+
+        Returns:
+            Number of distinct keywords of the group found
+        """
+        return sum(
+            1
+            for keyword_id in self.scan(text)
+            for label, _ in self._labels[keyword_id]
+            if label == group
+        )
+
+
+class PatternScanner:
+    """
+    Scan text with a list of regexes using one combined alternation.
+
+    Each pattern is wrapped in a named group inside a zero-width lookahead,
+    so the combined regex stops at every position where at least one rule
+    matches. ``scan`` reports exactly the patterns for which
+    ``pattern.search(text)`` would succeed, in their original order.
+    Patterns must share the same flags and must not use named groups or
+    numbered backreferences.
+    """
+
+    def __init__(self, patterns: Sequence[re.Pattern]):
+        """
+        Compile the combined scanner.
+
+        Args:
+            patterns: Compiled patterns to merge
+
+        Raises:
+            ValueError: If the patterns cannot be safely combined
+        """
+        self.patterns = list(patterns)
+        self._combined = None
+        if not self.patterns:
+            return
+
+        flags = {pattern.flags for pattern in self.patterns}
+        if len(flags) != 1:
+            raise ValueError("All patterns must be compiled with the same flags")
+        if any(pattern.groupindex for pattern in self.patterns):
+            raise ValueError("Patterns must not define named groups")
+
+        alternatives = "|".join(
+            f"(?P<p{index}>{pattern.pattern})"
+            for index, pattern in enumerate(self.patterns)
+        )
+        self._combined = re.compile(f"(?=(?:{alternatives}))", flags.pop())
+
+    def scan(self, *texts: str) -> List[str]:
+        """
+        Return the source strings of all patterns that match any of ``texts``.
+
+        Args:
+            texts: Texts to scan
+
+        Returns:
+            Pattern strings in declaration order
+        """
+        if self._combined is None:
+            return []
+
+        patterns = self.patterns
+        found = [False] * len(patterns)
+        remaining = len(patterns)
+
+        for text in texts:
+            for match in self._combined.finditer(text):
+                position = match.start()
+                index = int(match.lastgroup[1:])
+                if not found[index]:
+                    found[index] = True
+                    remaining -= 1
+                # Only the first alternative is reported at a position, so
+                # check the other outstanding rules at this offset directly.
+                for other, pattern in enumerate(patterns):
+                    if not found[other] and pattern.match(text, position):
+                        found[other] = True
+                        remaining -= 1
+                if not remaining:
+                    return [pattern.pattern for pattern in patterns]
+
+        return [
+            pattern.pattern
+            for pattern, hit in zip(patterns, found)
+            if hit
+        ]
+
+
+def _deletes(word: str, distance: int) -> set:
+    """All strings obtained by deleting up to ``distance`` characters."""
+    if distance == 1:
+        return {word[:index] + word[index + 1:] for index in range(len(word))} | {word}
+
+    results = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {
+            candidate[:index] + candidate[index + 1:]
+            for candidate in frontier
+            for index in range(len(candidate))
+        }
+        results |= frontier
+    return results
+
+
+def osa_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance (edits plus adjacent transpositions).
+
+    Args:
+        a: First string
+        b: Second string
+        max_distance: Bound of interest
+
+    Returns:
+        The distance, or max_distance + 1 if it is larger than max_distance
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost,
+            )
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+
+    return min(previous[-1], max_distance + 1)
+
+
+def load_wordlist(path: str) -> List[str]:
+    """
+    Read a word list: one lowercase word per line, "#" starts a comment.
+
+    Args:
+        path: Word list file
+
+    Returns:
+        The words, in file order
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [
+            word
+            for word in (line.split("#", 1)[0].strip() for line in f)
+            if word
+        ]
+
+
+class FuzzyMatcher:
+    """
+    Typo-tolerant lookup of single-word terms (SymSpell deletion index).
+
+    Every term is indexed under all strings reachable by deleting up to
+    ``max_distance`` characters. A token is looked up by its own deletions,
+    and candidates sharing one are confirmed with ``osa_distance``, so a
+    lookup costs a few dict probes instead of a comparison against every
+    term.
+
+    Ordinary words near the terms are indexed the same way. A token that is
+    one of them ("mediation"), or is at least as close to one of them as to
+    any term ("posage": dosage or postage), is not reported.
+    """
+
+    def __init__(
+        self,
+        groups: Dict[Hashable, Iterable[str]],
+        max_distance: int = 1,
+        min_length: int = 5,
+        ignore: Iterable[str] = (),
+        words: Iterable[str] = (),
+    ):
+        """
+        Build the index.
+
+        Args:
+            groups: Mapping of group label to its canonical terms
+            max_distance: Largest edit distance still reported as a match
+            min_length: Shorter tokens are never matched (too ambiguous)
+            ignore: Tokens never reported, e.g. spellings the exact keyword
+                tables already cover
+            words: Dictionary words near the terms (see load_wordlist)
+        """
+        self.max_distance = max_distance
+        self.min_length = min_length
+        self.ignore = frozenset(ignore)
+        self.groups = list(groups)
+        # term -> [(group, position in that group's list)]
+        self._labels: Dict[str, List[Tuple[Hashable, int]]] = {}
+        self._index: Dict[str, List[str]] = {}
+
+        for group, terms in groups.items():
+            for position, term in enumerate(terms):
+                labels = self._labels.setdefault(term, [])
+                labels.append((group, position))
+                if len(labels) > 1:
+                    continue
+                for deletion in _deletes(term, max_distance):
+                    self._index.setdefault(deletion, []).append(term)
+
+        self.words = frozenset(words) - self._labels.keys()
+        self._word_index: Dict[str, List[str]] = {}
+        for word in self.words:
+            for deletion in _deletes(word, max_distance):
+                self._word_index.setdefault(deletion, []).append(word)
+
+        lengths = [len(term) for term in self._labels] or [0]
+        self._min_token = max(min_length, min(lengths) - max_distance)
+        self._max_token = max(lengths) + max_distance
+        # Recent lookups; conversations reuse a small vocabulary
+        self._cache: Dict[str, Tuple[str, ...]] = {}
+
+    # Lookups remembered before the cache is emptied
+    CACHE_SIZE = 10000
+
+    def match(self, token: str) -> Tuple[str, ...]:
+        """
+        Terms within ``max_distance`` of one token.
+
+        Args:
+            token: Lowercase word
+
+        Returns:
+            Matching terms (empty for ignored or out-of-range tokens)
+        """
+        if (not self._min_token <= len(token) <= self._max_token
+                or token in self.ignore or token in self.words):
+            return ()
+
+        matches = self._cache.get(token)
+        if matches is None:
+            deletions = _deletes(token, self.max_distance)
+            distances = self._nearest(token, deletions, self._index)
+            matches = ()
+            if distances:
+                best = min(distances.values())
+                # Ambiguous: an ordinary word explains the token as well
+                words = self._nearest(token, deletions, self._word_index)
+                if not words or min(words.values()) > best:
+                    matches = tuple(distances)
+            if len(self._cache) >= self.CACHE_SIZE:
+                self._cache.clear()
+            self._cache[token] = matches
+        return matches
+
+    def _nearest(
+        self,
+        token: str,
+        deletions: Iterable[str],
+        index: Dict[str, List[str]],
+    ) -> Dict[str, int]:
+        """Entries of a deletion index within ``max_distance`` of ``token``."""
+        candidates = set()
+        for deletion in deletions:
+            entries = index.get(deletion)
+            if entries:
+                candidates.update(entries)
+        found = {}
+        for candidate in candidates:
+            distance = osa_distance(token, candidate, self.max_distance)
+            if distance <= self.max_distance:
+                found[candidate] = distance
+        return found
+
+    def find(self, tokens: Iterable[str]) -> Dict[Hashable, List[str]]:
+        """
+        Match a message's tokens against every group.
+
+        Args:
+            tokens: Lowercase words of the message
+
+        Returns:
+            Mapping of group label to the canonical terms matched, in
+            declaration order. Groups without hits map to an empty list.
+        """
+        positioned: Dict[Hashable, set] = {group: set() for group in self.groups}
+        for token in set(tokens):
+            for term in self.match(token):
+                for group, position in self._labels[term]:
+                    positioned[group].add((position, term))
+
+        return {
+            group: [term for _, term in sorted(hits)]
+            for group, hits in positioned.items()
+        }
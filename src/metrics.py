@@ -0,0 +1,300 @@
+"""
+In-process metrics with Prometheus text exposition.
+Counters, gauges and histograms are plain dicts guarded by a lock, cheap
+enough to update on every request; render() produces the /metrics payload.
+"""
+
+import bisect
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Request latencies (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Model generation latencies (seconds); generations run up to TIMEOUT_SECONDS
+GENERATION_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+# Generation speed (tokens per second)
+THROUGHPUT_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 50.0, 75.0, 100.0, 200.0)
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects."""
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """Render a {name="value",...} label set."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metric(ABC):
+    """Base class holding the name, help text and label names."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in declaration order."""
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines for the exposition format."""
+
+    def render(self) -> str:
+        """HELP/TYPE header plus samples."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        """Add ``amount`` to the series selected by ``labels``."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Current value of one series."""
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Metric):
+    """Point-in-time value, read from a callback when rendered."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        """Set the current value."""
+        self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Compute the value on every scrape instead of storing it."""
+        self._function = function
+
+    def samples(self) -> List[str]:
+        value = self._function() if self._function is not None else self._value
+        return [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(Metric):
+    """Bucketed distribution with sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        """Record one observation."""
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        """Number of observations in one series."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return sum(series[0]) if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1])) for key, s in self._series.items())
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        """Add a metric, or return the one already registered under its name."""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self.register(Gauge(name, documentation))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# Content type of render() output
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = MetricsRegistry()
+
+# HTTP layer (recorded by the Flask app)
+HTTP_REQUESTS = REGISTRY.counter(
+    "chatbot_http_requests_total",
+    "HTTP requests by route, method and status code.",
+    ("route", "method", "status"),
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    "chatbot_http_request_duration_seconds",
+    "Time to produce the HTTP response (first byte for streams).",
+    ("route",),
+)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "chatbot_active_sessions",
+    "Live sessions in the session store.",
+)
+
+# Conversation pipeline
+TURNS = REGISTRY.counter(
+    "chatbot_turns_total",
+    "Processed turns by safety action.",
+    ("safety_action",),
+)
+POLICY_TAGS = REGISTRY.counter(
+    "chatbot_policy_tags_total",
+    "Policy tags attached to responses.",
+    ("tag",),
+)
+GENERATION_LATENCY = REGISTRY.histogram(
+    "chatbot_model_generation_seconds",
+    "Wall time of model generations, request to final payload.",
+    buckets=GENERATION_BUCKETS,
+)
+GENERATION_THROUGHPUT = REGISTRY.histogram(
+    "chatbot_model_tokens_per_second",
+    "Generated tokens per second of Ollama eval time.",
+    buckets=THROUGHPUT_BUCKETS,
+)
+MODEL_ERRORS = REGISTRY.counter(
+    "chatbot_model_errors_total",
+    "Failed model generations by kind (timeout, error or unavailable).",
+    ("kind",),
+)
+
+
+# Generation scheduler
+GENERATION_QUEUE_TIME = REGISTRY.histogram(
+    "chatbot_generation_queue_seconds",
+    "Time generations waited for a model slot.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+GENERATION_REJECTED = REGISTRY.counter(
+    "chatbot_generation_rejected_total",
+    "Generations turned away as busy, by reason (queue_full or timeout).",
+    ("reason",),
+)
+GENERATION_QUEUE_DEPTH = REGISTRY.gauge(
+    "chatbot_generation_queue_depth",
+    "Generations waiting for a model slot.",
+)
+GENERATIONS_RUNNING = REGISTRY.gauge(
+    "chatbot_generations_running",
+    "Generations currently sent to the model.",
+)
+
+
+def record_turn(result: Dict):
+    """
+    Record the outcome of one processed turn.
+
+    Args:
+        result: Dict returned by ChatPipeline.process_message
+    """
+    TURNS.inc(safety_action=result.get("safety_action", "unknown"))
+    for tag in result.get("policy_tags", ()):
+        POLICY_TAGS.inc(tag=tag)
+
+    timings = result.get("timings") or {}
+    http_wait_ms = timings.get("http_wait_ms", 0)
+    if http_wait_ms:
+        GENERATION_LATENCY.observe(http_wait_ms / 1000)
+    eval_ms = timings.get("eval_ms", 0)
+    if eval_ms and timings.get("eval_count"):
+        GENERATION_THROUGHPUT.observe(timings["eval_count"] / (eval_ms / 1000))
+
+
+def record_model_error(error: Exception):
+    """Count a failed generation as a timeout or a generic error."""
+    MODEL_ERRORS.inc(kind="timeout" if isinstance(error, TimeoutError) else "error")
@@ -3,34 +3,687 @@ Model provider module for Ollama integration.
 This module is complete - students should NOT modify.
 """
 
+import asyncio
 import json
 import logging
+import threading
 import time
-from typing import Dict, List, Optional, Union
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Union
 
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
+from . import metrics
 from .config import (
+    GENERATION_MAX_CONCURRENCY,
+    GENERATION_QUEUE_SIZE,
+    GENERATION_QUEUE_TIMEOUT_SECONDS,
+    HEALTH_CHECK_INTERVAL_SECONDS,
+    HEALTH_RETRY_SECONDS,
+    KEEP_ALIVE_PING_SECONDS,
+    KEEP_ALIVE_SLOT_TIMEOUT_SECONDS,
     MODEL_ENDPOINT,
+    MODEL_KEEP_ALIVE,
     MODEL_NAME,
+    SESSION_IDLE_TTL_SECONDS,
+    SYSTEM_PROMPT,
     TIMEOUT_SECONDS,
     get_model_config,
 )
+from .prompt_budget import estimate_tokens, get_prompt_assembler
+from .response_cache import get_response_cache
 
 logger = logging.getLogger(__name__)
 
+# Tokens of the "User: " prefix and the response trailer of every prompt
+PROMPT_FRAMING_TOKENS = 10
 
-class ModelProvider:
+
+def elapsed_ms(since: float) -> float:
+    """Milliseconds elapsed since a time.perf_counter() reading."""
+    return round((time.perf_counter() - since) * 1000, 3)
+
+
+class SchedulerBusy(RuntimeError):
+    """Raised when no generation slot is available in time."""
+
+
+class _LoopTicket:
+    """
+    Queue ticket for a coroutine waiting on a generation slot.
+    
+    Mirrors the threading.Event tickets of threaded callers; set() may be
+    called from any thread and wakes the waiter on its own event loop.
+    """
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._set = False
+        self.future = loop.create_future()
+    
+    def is_set(self) -> bool:
+        return self._set
+    
+    def set(self):
+        self._set = True
+        self._loop.call_soon_threadsafe(self._wake)
+    
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class GenerationScheduler:
+    """
+    Admission control for generations sent to the local model.
+    
+    At most ``max_concurrency`` generations run at once; set it to the
+    Ollama server's OLLAMA_NUM_PARALLEL so requests are served instead of
+    piling up inside Ollama. Further requests wait in a bounded queue served
+    round-robin across sessions, so one busy session cannot starve the
+    others. A full queue, or a wait longer than ``queue_timeout``, raises
+    SchedulerBusy. Threads and coroutines share the same slots and queue.
+    
+    Usage:
+        with scheduler.slot(session_id):
+            ...  # call Ollama
+        
+        async with scheduler.aslot(session_id):
+            ...  # await Ollama
+    """
+    
+    def __init__(
+        self,
+        max_concurrency: int = GENERATION_MAX_CONCURRENCY,
+        max_queue: int = GENERATION_QUEUE_SIZE,
+        queue_timeout: float = GENERATION_QUEUE_TIMEOUT_SECONDS,
+    ):
+        """
+        Initialize scheduler limits.
+        
+        Args:
+            max_concurrency: Generations allowed to run at once
+            max_queue: Generations allowed to wait for a slot
+            queue_timeout: Seconds a generation may wait for a slot
+        """
+        if max_concurrency < 1:
+            raise ValueError(f"Invalid max_concurrency: {max_concurrency}")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+        # session -> waiting requests; sessions are served in rotation
+        self._lanes: "OrderedDict[str, Deque[Union[threading.Event, _LoopTicket]]]" = OrderedDict()
+        metrics.GENERATION_QUEUE_DEPTH.set_function(lambda: self._queued)
+        metrics.GENERATIONS_RUNNING.set_function(lambda: self._running)
+    
+    @contextmanager
+    def slot(self, session_id: Optional[str] = None, timeout: Optional[float] = None):
+        """Hold a generation slot for the duration of the block."""
+        self.acquire(session_id, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    def acquire(self, session_id: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Wait for a generation slot.
+        
+        Args:
+            session_id: Session the generation belongs to (None shares one lane)
+            timeout: Seconds to wait; ``queue_timeout`` if omitted
+            
+        Raises:
+            SchedulerBusy: If the queue is full or the wait timed out
+        """
+        start = time.perf_counter()
+        lane_key = session_id or ""
+        if timeout is None:
+            timeout = self.queue_timeout
+        ticket = self._enqueue(lane_key, threading.Event)
+        if ticket is None:
+            return
+        if not ticket.wait(timeout):
+            # The slot may have been handed over just as the wait expired
+            if self._withdraw(lane_key, ticket):
+                metrics.GENERATION_REJECTED.inc(reason="timeout")
+                raise SchedulerBusy(f"No generation slot within {timeout}s")
+        
+        metrics.GENERATION_QUEUE_TIME.observe(time.perf_counter() - start)
+    
+    @asynccontextmanager
+    async def aslot(self, session_id: Optional[str] = None):
+        """Asyncio counterpart of slot()."""
+        await self.aacquire(session_id)
+        try:
+            yield
+        finally:
+            self.release()
+    
+    async def aacquire(self, session_id: Optional[str] = None):
+        """
+        Asyncio counterpart of acquire().
+        
+        Waits without blocking the event loop, in the same queue and under
+        the same limit as threaded callers.
+        
+        Raises:
+            SchedulerBusy: If the queue is full or the wait timed out
+        """
+        start = time.perf_counter()
+        lane_key = session_id or ""
+        loop = asyncio.get_running_loop()
+        ticket = self._enqueue(lane_key, lambda: _LoopTicket(loop))
+        if ticket is None:
+            return
+        try:
+            await asyncio.wait_for(ticket.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # The slot may have been handed over just as the wait expired
+            if self._withdraw(lane_key, ticket):
+                metrics.GENERATION_REJECTED.inc(reason="timeout")
+                raise SchedulerBusy(
+                    f"No generation slot within {self.queue_timeout}s")
+        except asyncio.CancelledError:
+            # Give back a slot handed over just before the cancellation
+            if not self._withdraw(lane_key, ticket):
+                self.release()
+            raise
+        
+        metrics.GENERATION_QUEUE_TIME.observe(time.perf_counter() - start)
+    
+    def _enqueue(self, lane_key: str, make_ticket: Callable):
+        """
+        Take a free slot, or queue a new ticket in the session's lane.
+        
+        Returns:
+            None if a slot was taken, else the ticket set once one is handed over
+            
+        Raises:
+            SchedulerBusy: If the queue is full
+        """
+        with self._lock:
+            if self._running < self.max_concurrency and not self._queued:
+                self._running += 1
+                metrics.GENERATION_QUEUE_TIME.observe(0.0)
+                return None
+            if self._queued >= self.max_queue:
+                metrics.GENERATION_REJECTED.inc(reason="queue_full")
+                raise SchedulerBusy(
+                    f"Generation queue is full ({self.max_queue} waiting)")
+            ticket = make_ticket()
+            self._lanes.setdefault(lane_key, deque()).append(ticket)
+            self._queued += 1
+            return ticket
+    
+    def _withdraw(self, lane_key: str, ticket) -> bool:
+        """
+        Remove a ticket that stopped waiting.
+        
+        Returns:
+            True if it was still queued, False if a slot was already handed to it
+        """
+        with self._lock:
+            if ticket.is_set():
+                return False
+            lane = self._lanes[lane_key]
+            lane.remove(ticket)
+            if not lane:
+                del self._lanes[lane_key]
+            self._queued -= 1
+            return True
+    
+    def release(self):
+        """Free a slot, handing it to the next session in rotation if any."""
+        with self._lock:
+            if not self._lanes:
+                self._running -= 1
+                return
+            lane_key, lane = next(iter(self._lanes.items()))
+            ticket = lane.popleft()
+            # Move the session to the back of the rotation
+            del self._lanes[lane_key]
+            if lane:
+                self._lanes[lane_key] = lane
+            self._queued -= 1
+            ticket.set()
+    
+    @property
+    def queued(self) -> int:
+        """Generations waiting for a slot."""
+        return self._queued
+    
+    @property
+    def running(self) -> int:
+        """Generations holding a slot."""
+        return self._running
+
+
+class ModelUnavailable(RuntimeError):
+    """Raised when the health monitor found Ollama down or the model missing."""
+
+
+class HealthMonitor:
+    """
+    Background poller caching whether Ollama is up and the model is pulled.
+    
+    Until the first check completes the state is unknown and generations are
+    attempted normally. Once a check (or a failed request) finds the model
+    unreachable, generations fail fast with ModelUnavailable until a later
+    poll sees it back.
+    """
+    
+    def __init__(
+        self,
+        provider: "ModelProvider",
+        interval: float = HEALTH_CHECK_INTERVAL_SECONDS,
+        retry_interval: float = HEALTH_RETRY_SECONDS,
+    ):
+        """
+        Initialize the monitor; polling starts with start().
+        
+        Args:
+            provider: Provider whose endpoint and model are checked
+            interval: Seconds between checks while healthy
+            retry_interval: Seconds between checks while unhealthy
+        """
+        self.provider = provider
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.healthy: Optional[bool] = None  # Ollama reachable; None = unknown
+        self.model_available: Optional[bool] = None
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Plain session: the provider's retry backoff would stretch every
+        # failed probe to several seconds
+        self._http = requests.Session()
+    
+    @property
+    def ready(self) -> bool:
+        """False only once Ollama was found down or the model missing."""
+        return self.healthy is not False and self.model_available is not False
+    
+    def start(self):
+        """Start polling in a daemon thread (no-op if already running)."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="ollama-health", daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """Stop polling."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval if self.ready else self.retry_interval)
+    
+    def check(self) -> bool:
+        """
+        Query /api/tags once and update the cached state.
+        
+        Returns:
+            True if Ollama is up and the model is available
+        """
+        try:
+            response = self._http.get(
+                f"{self.provider.endpoint}/api/tags",
+                timeout=5
+            )
+            response.raise_for_status()
+            tags = response.json()
+        except Exception as e:
+            self._update(False, None, f"Cannot reach Ollama: {e}")
+            return False
+        
+        try:
+            self.provider._check_model_available(tags)
+        except RuntimeError as e:
+            self._update(True, False, str(e))
+            return False
+        
+        self._update(True, True, None)
+        return True
+    
+    def report_failure(self, error: Exception):
+        """Mark Ollama unreachable after a failed request; polling detects recovery."""
+        self._update(False, self.model_available, f"Cannot reach Ollama: {error}")
+        self.start()
+    
+    def _update(self, healthy: bool, model_available: Optional[bool], error: Optional[str]):
+        was_ready = self.ready
+        self.healthy = healthy
+        self.model_available = model_available
+        self.last_error = error
+        self.last_checked = time.time()
+        if self.ready and not was_ready:
+            logger.info(f"Ollama is available with model {self.provider.model_name}")
+        elif was_ready and not self.ready:
+            logger.warning(f"Model unavailable: {error}")
+    
+    def status(self) -> Dict:
+        """Cached state for health endpoints."""
+        return {
+            "ready": self.ready,
+            "healthy": self.healthy,
+            "model_available": self.model_available,
+            "model": self.provider.model_name,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+
+class ModelWarmer:
+    """
+    Keeps the model loaded in Ollama.
+    
+    Once Ollama is reachable the model is warmed up (loaded, and the system
+    prompt prefix evaluated once). While ``is_active`` reports live sessions
+    it is re-pinged every ``interval`` seconds so Ollama's keep_alive timer
+    does not unload it mid-conversation. After Ollama restarts, the next
+    healthy check triggers a new warm-up.
+    """
+    
+    def __init__(
+        self,
+        provider: "ModelProvider",
+        interval: float = KEEP_ALIVE_PING_SECONDS,
+        is_active: Optional[Callable[[], bool]] = None,
+    ):
+        """
+        Initialize the warmer; work starts with start().
+        
+        Args:
+            provider: Provider to warm up and ping
+            interval: Seconds between keep-alive pings
+            is_active: Returns True while sessions are active; defaults to
+                "a generation ran within SESSION_IDLE_TTL_SECONDS"
+        """
+        self.provider = provider
+        self.interval = interval
+        self.is_active = is_active or self._recently_used
+        self.warmed_up = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _recently_used(self) -> bool:
+        last = self.provider.last_activity
+        return last is not None and time.time() - last < SESSION_IDLE_TTL_SECONDS
+    
+    def start(self):
+        """Start warming up / pinging in a daemon thread (no-op if running)."""
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="ollama-keep-alive", daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=5)
+    
+    def _run(self):
+        health = self.provider.health
+        while not self._stop.is_set():
+            if health.healthy and health.ready:
+                if not self.warmed_up:
+                    self.warmed_up = self.provider.warm_up()
+                elif self.is_active():
+                    try:
+                        self.provider.ping()
+                    except requests.exceptions.RequestException as e:
+                        logger.warning(f"Keep-alive ping failed: {e}")
+                        self.warmed_up = False
+            else:
+                # Unknown or down: a (re)started Ollama has nothing loaded
+                self.warmed_up = False
+            self._stop.wait(self.interval if self.warmed_up else health.retry_interval)
+
+
+class BaseModelProvider:
+    """
+    Transport-independent parts of the Ollama provider.
+    
+    Prompt building, request payloads and result formatting are shared by
+    the blocking and the asyncio providers so both keep the same contract.
+    """
+    
+    endpoint: str = MODEL_ENDPOINT
+    model_name: str = MODEL_NAME
+    
+    def _check_model_available(self, tags: Dict):
+        """Raise if the configured model is missing from an /api/tags payload."""
+        models = tags.get("models", [])
+        model_names = [m.get("name", "") for m in models]
+        
+        if self.model_name not in model_names:
+            available = ", ".join(model_names) if model_names else "none"
+            raise RuntimeError(
+                f"Model '{self.model_name}' not found. "
+                f"Available models: {available}. "
+                f"Run: ollama pull {self.model_name}"
+            )
+    
+    def _prepare_request(
+        self,
+        prompt: str,
+        system_prompt: Optional[str],
+        conversation_history: Optional[List[Dict]],
+        context: Optional[List[int]],
+        stream: bool,
+        **kwargs
+    ) -> Dict:
+        """Build the /api/generate payload shared by generate and generate_stream."""
+        # Prepare the full prompt. A returned context already holds the system
+        # prompt and earlier turns, so only the new turn is rendered.
+        if context:
+            full_prompt = self._build_prompt(prompt)
+        else:
+            full_prompt = self._build_prompt(prompt, system_prompt, conversation_history)
+        
+        # Get model configuration
+        config = get_model_config()
+        
+        # Override with any provided kwargs
+        if kwargs:
+            config["options"].update(kwargs)
+        
+        request_data = {
+            "model": config["model"],
+            "prompt": full_prompt,
+            "stream": stream,
+            "options": config["options"],
+            "keep_alive": MODEL_KEEP_ALIVE,
+        }
+        if context:
+            request_data["context"] = context
+        
+        return request_data
+    
+    def _cached_result(
+        self,
+        request_data: Dict,
+        start_time: float,
+        prompt_build_ms: float,
+    ) -> Optional[Dict]:
+        """Return a stored result for a deterministic request, if any."""
+        cache = getattr(self, "response_cache", None)
+        if cache is None or not cache.is_cacheable(request_data):
+            return None
+        result = cache.get(cache.key(request_data))
+        if result is not None:
+            result["latency_ms"] = int((time.time() - start_time) * 1000)
+            result["timings"] = self._generation_timings({}, prompt_build_ms, 0.0)
+            result["cached"] = True
+            logger.debug("Serving model response from cache")
+        return result
+    
+    def _store_result(self, request_data: Dict, result: Dict):
+        """Remember a completed deterministic result for identical requests."""
+        cache = getattr(self, "response_cache", None)
+        if cache is None or not cache.is_cacheable(request_data):
+            return
+        if not result.get("done") or not result.get("response"):
+            return
+        cache.put(cache.key(request_data), result)
+    
+    def _format_result(
+        self,
+        result: Dict,
+        response_text: str,
+        request_data: Dict,
+        start_time: float,
+        prompt_build_ms: float = 0.0,
+        http_wait_ms: float = 0.0,
+    ) -> Dict:
+        """Convert a final Ollama payload into the provider's result dict."""
+        latency_ms = int((time.time() - start_time) * 1000)
+        
+        return {
+            "response": response_text,
+            "model": result.get("model", self.model_name),
+            "created_at": result.get("created_at", ""),
+            "done": result.get("done", True),
+            "context": result.get("context", []),
+            "total_duration": result.get("total_duration", 0),
+            "latency_ms": latency_ms,
+            "timings": self._generation_timings(result, prompt_build_ms, http_wait_ms),
+            "deterministic": request_data["options"]["temperature"] == 0,
+        }
+    
+    @staticmethod
+    def _generation_timings(
+        result: Dict,
+        prompt_build_ms: float,
+        http_wait_ms: float,
+    ) -> Dict:
+        """
+        Break a generation down into local and Ollama-side stages.
+        
+        Args:
+            result: Final Ollama payload (durations in nanoseconds)
+            prompt_build_ms: Time spent building the request
+            http_wait_ms: Time from sending the request to the final payload
+            
+        Returns:
+            Dict of stage durations (ms) and token counts
+        """
+        return {
+            "prompt_build_ms": prompt_build_ms,
+            "http_wait_ms": http_wait_ms,
+            "prompt_eval_ms": round(result.get("prompt_eval_duration", 0) / 1e6, 3),
+            "eval_ms": round(result.get("eval_duration", 0) / 1e6, 3),
+            "prompt_eval_count": result.get("prompt_eval_count", 0),
+            "eval_count": result.get("eval_count", 0),
+        }
+    
+    def _build_prompt(
+        self,
+        user_prompt: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None,
+    ) -> str:
+        """
+        Build full prompt with system prompt and conversation history.
+        
+        The prompt is kept within the assembler's token budget: the system
+        prompt always stays, an oversized user message is compressed, and
+        history over budget is abbreviated, then compressed or dropped
+        oldest first.
+        
+        Args:
+            user_prompt: Current user input
+            system_prompt: System instructions
+            conversation_history: List of previous turns
+            
+        Returns:
+            Formatted prompt string
+        """
+        parts = []
+        
+        # Add system prompt if provided
+        if system_prompt:
+            parts.append(f"### System Instructions ###")
+            parts.append(system_prompt)
+            parts.append("\n### Conversation ###\n")
+        
+        # Fixed framing first, then the user message, then what is left
+        # goes to history
+        reserved = sum(map(estimate_tokens, parts)) + PROMPT_FRAMING_TOKENS
+        user_prompt = self.prompt_assembler.fit_prompt(user_prompt, reserved)
+        reserved += estimate_tokens(user_prompt)
+        
+        # Add conversation history if provided
+        if conversation_history:
+            for role, content in self.prompt_assembler.fit_history(
+                    conversation_history, reserved):
+                if role == "user":
+                    parts.append(f"User: {content}")
+                else:
+                    parts.append(f"Assistant: {content}")
+            parts.append("")  # Empty line before current prompt
+        
+        # Add current user prompt
+        parts.append(f"User: {user_prompt}")
+        parts.append("\n### Response ###")
+        parts.append("Assistant: ")
+        
+        return "\n".join(parts)
+
+
+class ModelProvider(BaseModelProvider):
     """Handles communication with Ollama API."""
     
-    def __init__(self):
-        """Initialize the model provider with retry logic."""
-        self.endpoint = MODEL_ENDPOINT
+    def __init__(self, endpoint: Optional[str] = None):
+        """
+        Initialize the model provider with retry logic.
+        
+        Args:
+            endpoint: Ollama base URL; MODEL_ENDPOINT if omitted (e.g. a
+                local stub server for benchmarks)
+        """
+        self.endpoint = endpoint or MODEL_ENDPOINT
         self.model_name = MODEL_NAME
         self.session = self._create_session()
-        self._verify_connection()
+        self.response_cache = get_response_cache()
+        self.prompt_assembler = get_prompt_assembler()
+        self.scheduler = get_scheduler()
+        # Connectivity is checked in the background, not here, so creating a
+        # provider never blocks on (or fails because of) the model host
+        self.health = HealthMonitor(self)
+        self.warmer = ModelWarmer(self)
+        self.last_activity: Optional[float] = None
+    
+    def _ensure_ready(self):
+        """Start health monitoring and fail fast while the model is unavailable."""
+        self.health.start()
+        self.last_activity = time.time()
+        if not self.health.ready:
+            raise ModelUnavailable(self.health.last_error or "Model is not available")
     
     def _create_session(self) -> requests.Session:
         """Create HTTP session with retry logic."""
@@ -45,8 +698,16 @@ class ModelProvider:
         session.mount("https://", adapter)
         return session
     
-    def _verify_connection(self):
-        """Verify Ollama is running and model is available."""
+    def verify_connection(self):
+        """
+        Verify Ollama is running and model is available.
+        
+        Call this where failing early is wanted (e.g. before an evaluation
+        run); normal operation relies on the background health monitor.
+        
+        Raises:
+            RuntimeError: If Ollama is unreachable or the model is missing
+        """
         try:
             # Check Ollama is running
             response = self.session.get(
@@ -56,18 +717,10 @@ class ModelProvider:
             response.raise_for_status()
             
             # Check model is available
-            models = response.json().get("models", [])
-            model_names = [m.get("name", "") for m in models]
-            
-            if self.model_name not in model_names:
-                available = ", ".join(model_names) if model_names else "none"
-                raise RuntimeError(
-                    f"Model '{self.model_name}' not found. "
-                    f"Available models: {available}. "
-                    f"Run: ollama pull {self.model_name}"
-                )
+            self._check_model_available(response.json())
             
             logger.info(f"Successfully connected to Ollama with model {self.model_name}")
+            self.health.check()
             
         except requests.exceptions.ConnectionError:
             raise RuntimeError(
@@ -84,6 +737,8 @@ class ModelProvider:
         prompt: str,
         system_prompt: Optional[str] = None,
         conversation_history: Optional[List[Dict]] = None,
+        context: Optional[List[int]] = None,
+        session_id: Optional[str] = None,
         **kwargs
     ) -> Dict:
         """
@@ -93,104 +748,225 @@ class ModelProvider:
             prompt: User input prompt
             system_prompt: System prompt for behavior
             conversation_history: Previous conversation turns
+            context: Token context returned by a previous generation; when
+                given, only the new user turn is sent and the model continues
+                from that state
+            session_id: Session the request belongs to, for fair scheduling
             **kwargs: Additional parameters to override defaults
             
         Returns:
             Dict containing response and metadata
+            
+        Raises:
+            ModelUnavailable: If the model is known to be unreachable
+            SchedulerBusy: If no generation slot is available in time
         """
         start_time = time.time()
-        
-        # Prepare the full prompt
-        full_prompt = self._build_prompt(prompt, system_prompt, conversation_history)
-        
-        # Get model configuration
-        config = get_model_config()
-        
-        # Override with any provided kwargs
-        if kwargs:
-            config["options"].update(kwargs)
-        
-        # Prepare request
-        request_data = {
-            "model": config["model"],
-            "prompt": full_prompt,
-            "stream": False,
-            "options": config["options"],
-        }
+        stage_start = time.perf_counter()
+        request_data = self._prepare_request(
+            prompt, system_prompt, conversation_history, context,
+            stream=False, **kwargs
+        )
+        prompt_build_ms = elapsed_ms(stage_start)
+        cached = self._cached_result(request_data, start_time, prompt_build_ms)
+        if cached is not None:
+            return cached
+        self._ensure_ready()
         
         try:
             logger.debug(f"Sending request to model: {json.dumps(request_data, indent=2)}")
             
-            response = self.session.post(
-                f"{self.endpoint}/api/generate",
-                json=request_data,
-                timeout=TIMEOUT_SECONDS,
+            with self.scheduler.slot(session_id):
+                stage_start = time.perf_counter()
+                response = self.session.post(
+                    f"{self.endpoint}/api/generate",
+                    json=request_data,
+                    timeout=TIMEOUT_SECONDS,
+                )
+                response.raise_for_status()
+                
+                result = response.json()
+            formatted = self._format_result(
+                result, result.get("response", ""), request_data, start_time,
+                prompt_build_ms, elapsed_ms(stage_start),
             )
-            response.raise_for_status()
-            
-            result = response.json()
-            elapsed_ms = int((time.time() - start_time) * 1000)
-            
-            return {
-                "response": result.get("response", ""),
-                "model": result.get("model", self.model_name),
-                "created_at": result.get("created_at", ""),
-                "done": result.get("done", True),
-                "context": result.get("context", []),
-                "total_duration": result.get("total_duration", 0),
-                "latency_ms": elapsed_ms,
-                "deterministic": config["options"]["temperature"] == 0,
-            }
+            self._store_result(request_data, formatted)
+            return formatted
             
         except requests.exceptions.Timeout:
             logger.error(f"Model request timed out after {TIMEOUT_SECONDS}s")
             raise TimeoutError(f"Model generation timed out after {TIMEOUT_SECONDS}s")
         except requests.exceptions.RequestException as e:
             logger.error(f"Model request failed: {e}")
+            if isinstance(e, requests.exceptions.ConnectionError):
+                self.health.report_failure(e)
             raise RuntimeError(f"Failed to generate response: {e}")
     
-    def _build_prompt(
+    def generate_stream(
         self,
-        user_prompt: str,
+        prompt: str,
         system_prompt: Optional[str] = None,
         conversation_history: Optional[List[Dict]] = None,
-    ) -> str:
+        context: Optional[List[int]] = None,
+        session_id: Optional[str] = None,
+        **kwargs
+    ) -> Iterator[Dict]:
         """
-        Build full prompt with system prompt and conversation history.
+        Generate a response, yielding tokens as Ollama emits them.
+        
+        Closing the generator early closes the HTTP response, which makes
+        Ollama stop generating.
         
         Args:
-            user_prompt: Current user input
-            system_prompt: System instructions
-            conversation_history: List of previous turns
+            prompt: User input prompt
+            system_prompt: System prompt for behavior
+            conversation_history: Previous conversation turns
+            context: Token context returned by a previous generation; when
+                given, only the new user turn is sent and the model continues
+                from that state
+            session_id: Session the request belongs to, for fair scheduling
+            **kwargs: Additional parameters to override defaults
             
-        Returns:
-            Formatted prompt string
+        Yields:
+            {"token": str, "done": False} for each token, then a final dict
+            with the same keys as generate() plus "done": True
         """
-        parts = []
+        start_time = time.time()
+        stage_start = time.perf_counter()
+        request_data = self._prepare_request(
+            prompt, system_prompt, conversation_history, context,
+            stream=True, **kwargs
+        )
+        prompt_build_ms = elapsed_ms(stage_start)
+        cached = self._cached_result(request_data, start_time, prompt_build_ms)
+        if cached is not None:
+            # The whole response is known, so it arrives as a single token
+            if cached["response"]:
+                yield {"token": cached["response"], "done": False}
+            yield cached
+            return
+        self._ensure_ready()
         
-        # Add system prompt if provided
-        if system_prompt:
-            parts.append(f"### System Instructions ###")
-            parts.append(system_prompt)
-            parts.append("\n### Conversation ###\n")
+        try:
+            logger.debug(f"Sending streaming request to model: {json.dumps(request_data, indent=2)}")
+            
+            # The slot is held until the stream ends or the consumer closes it
+            with self.scheduler.slot(session_id):
+                stage_start = time.perf_counter()
+                response = self.session.post(
+                    f"{self.endpoint}/api/generate",
+                    json=request_data,
+                    timeout=TIMEOUT_SECONDS,
+                    stream=True,
+                )
+                response.raise_for_status()
+                
+                pieces = []
+                result: Dict = {}
+                try:
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise RuntimeError(f"Failed to generate response: {chunk['error']}")
+                        token = chunk.get("response", "")
+                        if token:
+                            pieces.append(token)
+                            yield {"token": token, "done": False}
+                        if chunk.get("done"):
+                            result = chunk
+                            break
+                finally:
+                    response.close()
+            
+            formatted = self._format_result(
+                result, "".join(pieces), request_data, start_time,
+                prompt_build_ms, elapsed_ms(stage_start),
+            )
+            self._store_result(request_data, formatted)
+            yield formatted
+            
+        except requests.exceptions.Timeout:
+            logger.error(f"Model request timed out after {TIMEOUT_SECONDS}s")
+            raise TimeoutError(f"Model generation timed out after {TIMEOUT_SECONDS}s")
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Model request failed: {e}")
+            if isinstance(e, requests.exceptions.ConnectionError):
+                self.health.report_failure(e)
+            raise RuntimeError(f"Failed to generate response: {e}")
+    
+    def warm_up(self) -> bool:
+        """
+        Load the model and evaluate the system prompt prefix once.
         
-        # Add conversation history if provided
-        if conversation_history:
-            for turn in conversation_history:
-                role = turn.get("role", "user")
-                content = turn.get("content", "")
-                if role == "user":
-                    parts.append(f"User: {content}")
-                elif role == "assistant":
-                    parts.append(f"Assistant: {content}")
-            parts.append("")  # Empty line before current prompt
+        Every conversation starts with the same system prompt, so running it
+        through the model ahead of time lets Ollama reuse the evaluated
+        prefix instead of paying for it on the first user message.
         
-        # Add current user prompt
-        parts.append(f"User: {user_prompt}")
-        parts.append("\n### Response ###")
-        parts.append("Assistant: ")
+        Returns:
+            True if the model answered, False otherwise
+        """
+        start_time = time.time()
+        config = get_model_config()
+        try:
+            with self.scheduler.slot(timeout=KEEP_ALIVE_SLOT_TIMEOUT_SECONDS):
+                self._load()
+                response = self.session.post(
+                    f"{self.endpoint}/api/generate",
+                    json={
+                        "model": config["model"],
+                        "prompt": self._build_prompt("Hello", SYSTEM_PROMPT),
+                        "stream": False,
+                        "options": dict(config["options"], num_predict=1),
+                        "keep_alive": MODEL_KEEP_ALIVE,
+                    },
+                    timeout=TIMEOUT_SECONDS,
+                )
+                response.raise_for_status()
+        except SchedulerBusy:
+            # Running generations load the model anyway; retry later
+            logger.info("Model warm-up skipped: no free generation slot")
+            return False
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Model warm-up failed: {e}")
+            return False
         
-        return "\n".join(parts)
+        warm_up_ms = int((time.time() - start_time) * 1000)
+        logger.info(f"Warmed up {self.model_name} in {warm_up_ms}ms")
+        return True
+    
+    def ping(self) -> bool:
+        """
+        Load the model, or refresh its keep_alive timer, without generating.
+        
+        The ping takes a generation slot like any other request, so it never
+        queues ahead of users inside Ollama. It is skipped when no slot frees
+        up within KEEP_ALIVE_SLOT_TIMEOUT_SECONDS: the running generations
+        refresh the timer themselves.
+        
+        Returns:
+            True if the model was pinged, False if the ping was skipped
+            
+        Raises:
+            requests.exceptions.RequestException: If Ollama cannot be reached
+        """
+        try:
+            with self.scheduler.slot(timeout=KEEP_ALIVE_SLOT_TIMEOUT_SECONDS):
+                self._load()
+        except SchedulerBusy:
+            logger.debug("Keep-alive ping skipped: no free generation slot")
+            return False
+        return True
+    
+    def _load(self):
+        """Send an empty request, which only loads the model; caller holds a slot."""
+        response = self.session.post(
+            f"{self.endpoint}/api/generate",
+            json={"model": self.model_name, "keep_alive": MODEL_KEEP_ALIVE},
+            timeout=TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
     
     def health_check(self) -> bool:
         """
@@ -209,13 +985,28 @@ class ModelProvider:
             return False
 
 
-# Singleton instance
+# Singleton instances
+_scheduler_instance = None
+_scheduler_lock = threading.Lock()
 _provider_instance = None
+_provider_lock = threading.Lock()
+
+
+def get_scheduler() -> GenerationScheduler:
+    """Get or create the scheduler shared by the blocking and asyncio providers."""
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        with _scheduler_lock:
+            if _scheduler_instance is None:
+                _scheduler_instance = GenerationScheduler()
+    return _scheduler_instance
 
 
 def get_provider() -> ModelProvider:
     """Get or create singleton model provider instance."""
     global _provider_instance
     if _provider_instance is None:
-        _provider_instance = ModelProvider()
+        with _provider_lock:
+            if _provider_instance is None:
+                _provider_instance = ModelProvider()
     return _provider_instance
\ No newline at end of file
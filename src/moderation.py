@@ -4,12 +4,32 @@ Students must complete TODO sections according to POLICY.md.
 """
 
 import logging
+import os
 import re
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from enum import Enum
-from typing import Dict, List, Optional, Set, Tuple
-
-from .config import SAFETY_MODE
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .config import (
+    ESCALATION_THRESHOLD,
+    FUZZY_MATCH_DISTANCE,
+    FUZZY_MATCH_MIN_LENGTH,
+    FUZZY_WORDLIST_FILE,
+    MODERATION_BATCH_SIZE,
+    SAFETY_MODE,
+)
+from .matching import (
+    FuzzyMatcher,
+    KeywordAutomaton,
+    NormalizedText,
+    PatternScanner,
+    load_wordlist,
+)
+from .session_state import EscalationTracker
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +51,15 @@ class ModerationResult:
     # Response to use if action != ALLOW
     fallback_response: Optional[str] = None
 
+    def verdict(self) -> Dict:
+        """Compact JSON-ready form without the fallback text."""
+        return {
+            "action": self.action.value,
+            "tags": list(self.tags),
+            "reason": self.reason,
+            "confidence": self.confidence,
+        }
+
 
 class Moderator:
     """Handles content moderation according to safety policy."""
@@ -130,6 +159,27 @@ class Moderator:
             ],
         }
 
+        # Canonical spellings also matched with typos (FUZZY_MATCH_DISTANCE);
+        # reported under the canonical term like an exact keyword hit
+        self.fuzzy_terms: Dict[str, List[str]] = {
+            "crisis": ["suicide", "suicidal", "overdose"],
+            "medical": [
+                "diagnose", "diagnosis", "medication", "medicine", "prescription",
+                "dosage", "antidepressant", "prozac", "zoloft", "xanax", "adderall",
+                "bipolar", "schizophrenia",
+            ],
+        }
+        # Ordinary words near those terms ("mediation", "dedication"), so
+        # they and tokens closer to them are not read as typos
+        self.fuzzy_words: List[str] = []
+        if FUZZY_MATCH_DISTANCE:
+            if os.path.exists(FUZZY_WORDLIST_FILE):
+                self.fuzzy_words = load_wordlist(FUZZY_WORDLIST_FILE)
+            else:
+                logger.warning(
+                    f"Fuzzy word list {FUZZY_WORDLIST_FILE} not found; "
+                    "real words near crisis/medical terms may be flagged")
+
         self.confidence_thresholds = {
             "strict": {
                 "crisis": 0.3,
@@ -219,23 +269,74 @@ Your wellbeing is important. How can I support you today?
             re.compile(r"\b(?:let's|lets) get revenge\b", re.IGNORECASE),
         ]
 
+        # Compile every keyword table into one automaton so a message is
+        # scanned once for all categories instead of once per keyword.
+        keyword_tables: Dict[str, List[str]] = {
+            "crisis": self.crisis_keywords,
+            "medical": self.medical_keywords,
+        }
+        for category, keywords in self.harmful_content.items():
+            keyword_tables[f"harmful_{category}"] = keywords
+        self.keyword_automaton = KeywordAutomaton(keyword_tables)
+        # Exact keywords are left to the automaton
+        self.fuzzy_matcher = FuzzyMatcher(
+            self.fuzzy_terms,
+            max_distance=FUZZY_MATCH_DISTANCE,
+            min_length=FUZZY_MATCH_MIN_LENGTH,
+            ignore=set().union(*keyword_tables.values()),
+            words=self.fuzzy_words,
+        ) if FUZZY_MATCH_DISTANCE else None
+
+        # Each regex list is merged into a single alternation so a message is
+        # scanned once per stage rather than once per pattern.
+        self.crisis_scanner = PatternScanner(self.crisis_patterns)
+        self.medical_scanner = PatternScanner(self.medical_patterns)
+        self.model_medical_advice_scanner = PatternScanner(
+            self.model_medical_advice_patterns)
+        self.model_inappropriate_scanner = PatternScanner(
+            self.model_inappropriate_patterns)
+
     def _get_threshold(self, category: str) -> float:
         """Return the confidence threshold for the given category based on safety mode."""
         mode_config = self.confidence_thresholds.get(
             self.safety_mode, self.confidence_thresholds["balanced"])
         return mode_config.get(category, 1.0)
 
+    @staticmethod
+    def _normalize(text: Union[str, NormalizedText]) -> NormalizedText:
+        """Normalized view of a message, reusing one that already exists."""
+        if isinstance(text, NormalizedText):
+            return text
+        return NormalizedText(text)
+
+    def _scan_keywords(self, text: NormalizedText) -> Dict[str, List[str]]:
+        """
+        Return keyword hits for every keyword table in one pass per variant,
+        plus canonical terms that a word of the message misspells.
+        """
+        keyword_hits = self.keyword_automaton.find(*text.variants)
+        if self.fuzzy_matcher is not None:
+            for group, terms in self.fuzzy_matcher.find(text.tokens).items():
+                hits = keyword_hits[group]
+                hits.extend(term for term in terms if term not in hits)
+        return keyword_hits
+
     def moderate(
         self,
         user_prompt: str,
         model_response: Optional[str] = None,
         context: Optional[List[Dict]] = None,
+        escalation: Optional[EscalationTracker] = None,
     ) -> ModerationResult:
         """
         Perform moderation on user input and/or model output.
 
         Args:
             user_prompt: The user's input text
+            model_response: Model output to check as well
+            context: Previous messages to rescan for escalation
+            escalation: Session escalation state; used instead of ``context``
+                and updated with this prompt's crisis hits
 
         Returns:
             ModerationResult with action and explanation
@@ -246,22 +347,22 @@ Your wellbeing is important. How can I support you today?
         3. Check harmful content (filter inappropriate)
         """
 
-        # Example skeleton:
-        # Step 1: Check for crisis indicators (highest priority)
-        crisis_check = self._check_crisis(user_prompt)
-        if crisis_check.action != ModerationAction.ALLOW:
-            logger.warning(f"Crisis detected: {crisis_check.reason}")
-            return crisis_check
+        # The prompt is normalized and matched against all keyword tables once;
+        # both results are shared by the checks
+        text = NormalizedText(user_prompt)
+        keyword_hits = self._scan_keywords(text)
 
-        medical_check = self._check_medical(user_prompt)
-        if medical_check.action != ModerationAction.ALLOW:
-            logger.info(f"Medical boundary triggered: {medical_check.reason}")
-            return medical_check
+        # Escalation looks at earlier turns only; record this one for the next
+        prior_crisis_hits = None
+        if escalation is not None:
+            prior_crisis_hits = escalation.total
+            escalation.record(len(keyword_hits["crisis"]))
 
-        harmful_check = self._check_harmful(user_prompt)
-        if harmful_check.action != ModerationAction.ALLOW:
-            logger.warning(f"Harmful content detected: {harmful_check.reason}")
-            return harmful_check
+        violation = self._input_violation(text, keyword_hits)
+        if violation is not None:
+            level, label, check = violation
+            logger.log(level, f"{label}: {check.reason}")
+            return check
 
         # If model response provided, check it
         if model_response:
@@ -271,8 +372,12 @@ Your wellbeing is important. How can I support you today?
                 return output_check
 
         # Check context for concerning patterns
-        if context:
+        context_check = None
+        if prior_crisis_hits is not None:
+            context_check = self._check_escalation(prior_crisis_hits)
+        elif context:
             context_check = self._check_context_patterns(context)
+        if context_check is not None:
             if context_check.action != ModerationAction.ALLOW:
                 logger.info(f"Context concern: {context_check.reason}")
                 return context_check
@@ -285,11 +390,163 @@ Your wellbeing is important. How can I support you today?
             confidence=1.0,
         )
 
-    def _check_crisis(self, text: str) -> ModerationResult:
+    def _input_violation(
+        self,
+        user_prompt: NormalizedText,
+        keyword_hits: Dict[str, List[str]],
+    ) -> Optional[Tuple[int, str, ModerationResult]]:
+        """
+        Run the user input checks in priority order.
+
+        Returns:
+            (log level, log label, result) of the first check that does not
+            allow the prompt, or None when all of them pass
+        """
+        # Step 1: Check for crisis indicators (highest priority)
+        crisis_check = self._check_crisis(user_prompt, keyword_hits)
+        if crisis_check.action != ModerationAction.ALLOW:
+            return logging.WARNING, "Crisis detected", crisis_check
+
+        medical_check = self._check_medical(user_prompt, keyword_hits)
+        if medical_check.action != ModerationAction.ALLOW:
+            return logging.INFO, "Medical boundary triggered", medical_check
+
+        harmful_check = self._check_harmful(user_prompt, keyword_hits)
+        if harmful_check.action != ModerationAction.ALLOW:
+            return logging.WARNING, "Harmful content detected", harmful_check
+
+        return None
+
+    def moderate_output(self, model_response: str) -> ModerationResult:
+        """
+        Moderate a model response without re-screening the user prompt.
+
+        Intended for the output pass of a turn whose input has already been
+        cleared by ``moderate``.
+
+        Args:
+            model_response: The model's generated text
+
+        Returns:
+            ModerationResult with action and explanation
+        """
+        output_check = self._check_model_output(model_response)
+        if output_check.action != ModerationAction.ALLOW:
+            logger.warning(f"Output violation: {output_check.reason}")
+            return output_check
+
+        return ModerationResult(
+            action=ModerationAction.ALLOW,
+            tags=[],
+            reason="Content passes all safety checks",
+            confidence=1.0,
+        )
+
+    def check_message(self, content: str, role: str = "user") -> ModerationResult:
+        """
+        Moderate one stored message on its own, without logging.
+
+        User messages get the same checks as ``moderate`` without context;
+        assistant messages the same checks as ``moderate_output``.
+
+        Args:
+            content: Message text
+            role: "user" or "assistant"
+
+        Returns:
+            ModerationResult with action and explanation
+        """
+        if role == "assistant":
+            check = self._check_model_output(content)
+            if check.action != ModerationAction.ALLOW:
+                return check
+        else:
+            text = NormalizedText(content)
+            violation = self._input_violation(text, self._scan_keywords(text))
+            if violation is not None:
+                return violation[2]
+
+        return ModerationResult(
+            action=ModerationAction.ALLOW,
+            tags=[],
+            reason="Content passes all safety checks",
+            confidence=1.0,
+        )
+
+    def moderate_iter(
+        self,
+        messages: Iterable[Union[str, Dict]],
+        workers: Optional[int] = None,
+        batch_size: int = MODERATION_BATCH_SIZE,
+    ) -> Iterator[Dict]:
+        """
+        Moderate a stream of messages, yielding compact verdicts in order.
+
+        Messages are read lazily in batches of ``batch_size``; with more than
+        one worker the batches are spread over a process pool, with at most
+        two batches per worker in flight.
+
+        Args:
+            messages: Strings (user messages) or dicts with "content" and an
+                optional "role" ("user" or "assistant")
+            workers: Worker processes; None uses every CPU, 1 runs in-process
+            batch_size: Messages sent to a worker at a time
+
+        Yields:
+            ModerationResult.verdict() dicts, one per message
+        """
+        batches = _batched((_as_message(m) for m in messages), batch_size)
+        workers = workers or os.cpu_count() or 1
+
+        if workers <= 1:
+            for batch in batches:
+                yield from _moderate_messages(self, batch)
+            return
+
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_batch_worker,
+            initargs=(self,),
+        )
+        try:
+            pending = deque()
+            for batch in batches:
+                pending.append(pool.submit(_moderate_batch_in_worker, batch))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+
+    def moderate_batch(
+        self,
+        messages: Iterable[Union[str, Dict]],
+        workers: Optional[int] = None,
+        batch_size: int = MODERATION_BATCH_SIZE,
+    ) -> List[Dict]:
+        """
+        Moderate many messages at once.
+
+        Args:
+            messages: See moderate_iter
+            workers: See moderate_iter
+            batch_size: See moderate_iter
+
+        Returns:
+            List of verdict dicts in input order
+        """
+        return list(self.moderate_iter(messages, workers, batch_size))
+
+    def _check_crisis(
+        self,
+        text: Union[str, NormalizedText],
+        keyword_hits: Optional[Dict[str, List[str]]] = None,
+    ) -> ModerationResult:
         """Check user input for crisis indicators and escalate when needed."""
 
-        text_lower = text.lower()
-        if not text_lower.strip():
+        text = self._normalize(text)
+        if not text:
             return ModerationResult(
                 action=ModerationAction.ALLOW,
                 tags=[],
@@ -297,9 +554,10 @@ Your wellbeing is important. How can I support you today?
                 confidence=0.0,
             )
 
-        keyword_hits = [kw for kw in self.crisis_keywords if kw in text_lower]
-        pattern_hits = [
-            pat.pattern for pat in self.crisis_patterns if pat.search(text)]
+        if keyword_hits is None:
+            keyword_hits = self._scan_keywords(text)
+        keyword_hits = keyword_hits["crisis"]
+        pattern_hits = self.crisis_scanner.scan(*text.variants)
 
         confidence = 0.0
         if keyword_hits:
@@ -339,10 +597,14 @@ Your wellbeing is important. How can I support you today?
             confidence=confidence,
         )
 
-    def _check_medical(self, text: str) -> ModerationResult:
+    def _check_medical(
+        self,
+        text: Union[str, NormalizedText],
+        keyword_hits: Optional[Dict[str, List[str]]] = None,
+    ) -> ModerationResult:
         """Detect medical boundary violations and trigger safe fallback."""
-        text_lower = text.lower()
-        if not text_lower.strip():
+        text = self._normalize(text)
+        if not text:
             return ModerationResult(
                 action=ModerationAction.ALLOW,
                 tags=[],
@@ -350,9 +612,10 @@ Your wellbeing is important. How can I support you today?
                 confidence=0.0,
             )
 
-        keyword_hits = [kw for kw in self.medical_keywords if kw in text_lower]
-        pattern_hits = [
-            pat.pattern for pat in self.medical_patterns if pat.search(text)]
+        if keyword_hits is None:
+            keyword_hits = self._scan_keywords(text)
+        keyword_hits = keyword_hits["medical"]
+        pattern_hits = self.medical_scanner.scan(*text.variants)
 
         confidence = 0.0
         if keyword_hits:
@@ -392,11 +655,15 @@ Your wellbeing is important. How can I support you today?
             confidence=confidence,
         )
 
-    def _check_harmful(self, text: str) -> ModerationResult:
+    def _check_harmful(
+        self,
+        text: Union[str, NormalizedText],
+        keyword_hits: Optional[Dict[str, List[str]]] = None,
+    ) -> ModerationResult:
         """Filter for harmful requests involving violence, illegality, or harassment."""
 
-        text_lower = text.lower()
-        if not text_lower.strip():
+        text = self._normalize(text)
+        if not text:
             return ModerationResult(
                 action=ModerationAction.ALLOW,
                 tags=[],
@@ -404,9 +671,12 @@ Your wellbeing is important. How can I support you today?
                 confidence=0.0,
             )
 
+        if keyword_hits is None:
+            keyword_hits = self._scan_keywords(text)
+
         triggered: Dict[str, List[str]] = {}
-        for category, keywords in self.harmful_content.items():
-            matches = [kw for kw in keywords if kw in text_lower]
+        for category in self.harmful_content:
+            matches = keyword_hits[f"harmful_{category}"]
             if matches:
                 triggered[category] = matches
 
@@ -448,10 +718,8 @@ Your wellbeing is important. How can I support you today?
     def _check_model_output(self, response: str) -> ModerationResult:
         """Audit model responses for disallowed advice or unsafe suggestions."""
 
-        medical_flags = [
-            pat.pattern for pat in self.model_medical_advice_patterns if pat.search(response)]
-        harmful_flags = [
-            pat.pattern for pat in self.model_inappropriate_patterns if pat.search(response)]
+        medical_flags = self.model_medical_advice_scanner.scan(response)
+        harmful_flags = self.model_inappropriate_scanner.scan(response)
 
         if medical_flags:
             return ModerationResult(
@@ -479,17 +747,21 @@ Your wellbeing is important. How can I support you today?
         )
 
     def _check_context_patterns(self, context: List[Dict]) -> ModerationResult:
+        """Rescan previous user messages for escalation (no tracked state)."""
 
         # Check for escalation
         crisis_count = 0
         for turn in context:
             if turn.get("role") == "user":
-                content = turn.get("content", "").lower()
-                for keyword in self.crisis_keywords:
-                    if keyword in content:
-                        crisis_count += 1
+                text = NormalizedText(turn.get("content", ""))
+                crisis_count += len(self._scan_keywords(text)["crisis"])
+
+        return self._check_escalation(crisis_count)
+
+    def _check_escalation(self, crisis_count: int) -> ModerationResult:
+        """Fall back once earlier turns add up to ESCALATION_THRESHOLD crisis hits."""
 
-        if crisis_count >= 3:
+        if crisis_count >= ESCALATION_THRESHOLD:
             return ModerationResult(
                 action=ModerationAction.SAFE_FALLBACK,
                 tags=["pattern_escalation", "repeated_crisis"],
@@ -510,13 +782,61 @@ Your wellbeing is important. How can I support you today?
         return self.fallback_templates.get("disclaimer", "")
 
 
+def _as_message(message: Union[str, Dict]) -> Tuple[str, str]:
+    """Normalize a batch input to (content, role)."""
+    if isinstance(message, str):
+        return message, "user"
+    return message.get("content") or "", message.get("role", "user")
+
+
+def _batched(items: Iterable, size: int) -> Iterator[List]:
+    """Split an iterable into lists of at most ``size`` items."""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _moderate_messages(
+    moderator: "Moderator",
+    batch: List[Tuple[str, str]],
+) -> List[Dict]:
+    """Verdicts for one batch of (content, role) messages."""
+    return [
+        moderator.check_message(content, role).verdict()
+        for content, role in batch
+    ]
+
+
+# Moderator of a batch worker process
+_batch_moderator: Optional["Moderator"] = None
+
+
+def _init_batch_worker(moderator: "Moderator"):
+    """Process pool initializer: keep the parent's moderator."""
+    global _batch_moderator
+    _batch_moderator = moderator
+
+
+def _moderate_batch_in_worker(batch: List[Tuple[str, str]]) -> List[Dict]:
+    """Process pool task: moderate one batch."""
+    return _moderate_messages(_batch_moderator, batch)
+
+
 # Singleton instance
 _moderator_instance = None
+_moderator_lock = threading.Lock()
 
 
 def get_moderator() -> Moderator:
     """Get singleton moderator instance."""
     global _moderator_instance
     if _moderator_instance is None:
-        _moderator_instance = Moderator()
+        # Building the tables takes a while; concurrent first callers wait
+        # for one instance instead of each compiling their own
+        with _moderator_lock:
+            if _moderator_instance is None:
+                _moderator_instance = Moderator()
     return _moderator_instance
@@ -0,0 +1,203 @@
+"""
+Token-budgeted prompt assembly.
+Prompt sizes are estimated locally and the conversation history is fitted
+into PROMPT_TOKEN_BUDGET, newest turns first, so the prefill cost of a turn
+stays bounded however long the conversation or its messages get.
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .config import PROMPT_TOKEN_BUDGET
+
+# Older turns are dropped rather than squeezed below this many tokens
+MIN_COMPRESSED_TOKENS = 24
+# Inserted where compress() removed text
+ELLIPSIS = " [...] "
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in ``text``.
+
+    BPE tokenizers average about four UTF-8 bytes per token on English
+    prose; the number of spaces and line breaks is a floor for text made of
+    short words. Both are counted in C, without splitting the text.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    if not text:
+        return 0
+    size = len(text) if text.isascii() else len(text.encode("utf-8"))
+    return max((size + 3) // 4, text.count(" ") + text.count("\n") + 1)
+
+
+def compress(text: str, max_tokens: int) -> str:
+    """
+    Shorten text extractively to about ``max_tokens`` tokens.
+
+    Leading sentences are kept while they fit, then the last sentence if
+    there is room for it; the gap is marked with ELLIPSIS. A first sentence
+    that does not fit on its own is cut.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token budget for the result
+
+    Returns:
+        ``text`` unchanged if it fits, otherwise a shortened version
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    budget = max_tokens - estimate_tokens(ELLIPSIS)
+    sentences = [s for s in _SENTENCE_BREAK.split(text.strip()) if s]
+    if not sentences:
+        # Only whitespace, nothing worth keeping
+        return text.strip()
+    last = sentences[-1]
+    last_tokens = estimate_tokens(last)
+
+    kept: List[str] = []
+    used = 0
+    for sentence in sentences[:-1]:
+        tokens = estimate_tokens(sentence) + 1
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+
+    if not kept:
+        # Cut the first sentence in proportion to its estimated size
+        first = sentences[0]
+        keep_chars = len(first) * max(budget, 1) // estimate_tokens(first)
+        return first[:keep_chars].rstrip() + ELLIPSIS.rstrip()
+
+    result = " ".join(kept)
+    if used + last_tokens <= budget:
+        return result + ELLIPSIS + last
+    return result + ELLIPSIS.rstrip()
+
+
+class PromptAssembler:
+    """
+    Fit conversation history into a prompt token budget.
+
+    History that fits is rendered unchanged. Otherwise registered texts
+    (safety templates, the disclaimer) are replaced by short placeholders
+    wherever they occur in history, since the model does not need to
+    re-read them on every turn. The remaining turns are added newest first
+    while they fit; the first one that does not fit is compressed if enough
+    budget is left, and everything older is dropped.
+    """
+
+    def __init__(self, budget: int = PROMPT_TOKEN_BUDGET):
+        """
+        Configure the assembler.
+
+        Args:
+            budget: Estimated tokens allowed for the whole prompt
+        """
+        self.budget = budget
+        self._placeholders: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add_placeholders(self, placeholders: Dict[str, str]):
+        """
+        Register texts to abbreviate in history.
+
+        Args:
+            placeholders: Mapping of full text to its short replacement
+        """
+        with self._lock:
+            merged = dict(self._placeholders)
+            merged.update(
+                (text.strip(), placeholder)
+                for text, placeholder in placeholders.items()
+                if text.strip()
+            )
+            # Swapped in whole, so readers never see a dict being resized
+            self._placeholders = merged
+
+    def abbreviate(self, content: str) -> str:
+        """Replace registered texts in one message by their placeholders."""
+        for text, placeholder in self._placeholders.items():
+            if text in content:
+                content = content.replace(text, placeholder)
+        return content
+
+    def fit_prompt(self, user_prompt: str, reserved: int) -> str:
+        """
+        Shorten the current user message if it alone exceeds the budget.
+
+        Args:
+            user_prompt: Current user input
+            reserved: Tokens already taken by the system prompt and framing
+
+        Returns:
+            The message, compressed if needed
+        """
+        return compress(user_prompt, max(self.budget - reserved, MIN_COMPRESSED_TOKENS))
+
+    def fit_history(
+        self,
+        history: Optional[List[Dict]],
+        reserved: int,
+    ) -> List[Tuple[str, str]]:
+        """
+        Select the turns that fit in what is left of the budget.
+
+        Args:
+            history: Previous messages, oldest first
+            reserved: Tokens already taken by the rest of the prompt
+
+        Returns:
+            (role, content) pairs of user and assistant messages, oldest
+            first, abbreviated and possibly compressed if over budget
+        """
+        remaining = self.budget - reserved
+        turns = [
+            (turn.get("role", "user"), turn.get("content", ""))
+            for turn in history or ()
+            if turn.get("role", "user") in ("user", "assistant")
+        ]
+        # "User: " / "Assistant: " prefix and the line break
+        if sum(estimate_tokens(content) + 3 for _, content in turns) <= remaining:
+            return turns
+
+        selected: List[Tuple[str, str]] = []
+
+        for role, content in reversed(turns):
+            content = self.abbreviate(content)
+            tokens = estimate_tokens(content) + 3
+            if tokens > remaining:
+                if remaining >= MIN_COMPRESSED_TOKENS:
+                    selected.append((role, compress(content, remaining - 3)))
+                break
+            selected.append((role, content))
+            remaining -= tokens
+
+        selected.reverse()
+        return selected
+
+
+# Singleton instance
+_assembler_instance = None
+_assembler_lock = threading.Lock()
+
+
+def get_prompt_assembler() -> PromptAssembler:
+    """Get or create the prompt assembler shared by the model providers."""
+    global _assembler_instance
+    if _assembler_instance is None:
+        with _assembler_lock:
+            if _assembler_instance is None:
+                _assembler_instance = PromptAssembler()
+    return _assembler_instance
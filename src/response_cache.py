@@ -0,0 +1,168 @@
+"""
+Response cache module for deterministic generations.
+With temperature 0 and a fixed seed Ollama returns the same text for the same
+request, so results are stored under a hash of the full request (model, built
+prompt, options and token context) and served without calling the model.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_SIZE
+from .sqlite_utils import SQLiteConnections
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of model results.
+
+    Lookups go to an in-memory LRU first and then, if configured, to a SQLite
+    file that persists across runs and processes. Only requests whose options
+    are deterministic (temperature 0) are ever cached.
+    """
+
+    def __init__(self, max_size: int = RESPONSE_CACHE_SIZE, path: Optional[str] = None):
+        """
+        Initialize the cache tiers.
+
+        Args:
+            max_size: Results kept in memory
+            path: SQLite file for the persistent tier (None for memory only)
+        """
+        if max_size < 1:
+            raise ValueError(f"Invalid max_size: {max_size}")
+        self.max_size = max_size
+        self.path = path
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = SQLiteConnections(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+        if self._db is not None:
+            with self._db.connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY,"
+                    " result TEXT NOT NULL,"
+                    " created_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def is_cacheable(request_data: Dict) -> bool:
+        """Return True if the request always produces the same output."""
+        return request_data["options"].get("temperature") == 0
+
+    @staticmethod
+    def key(request_data: Dict) -> str:
+        """
+        Hash everything that determines the model output.
+
+        Args:
+            request_data: /api/generate payload
+
+        Returns:
+            Hex digest identifying the request
+        """
+        material = json.dumps(
+            {
+                "model": request_data["model"],
+                "prompt": request_data["prompt"],
+                "options": request_data["options"],
+                "context": request_data.get("context"),
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a stored result.
+
+        Args:
+            key: Request hash from key()
+
+        Returns:
+            Copy of the stored result, or None on a miss
+        """
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+
+        if result is None and self.path:
+            row = self._db.connect().execute(
+                "SELECT result FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                result = json.loads(row[0])
+                self._remember(key, result)
+
+        with self._lock:
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return dict(result)
+
+    def put(self, key: str, result: Dict):
+        """
+        Store a result in every tier.
+
+        Args:
+            key: Request hash from key()
+            result: Provider result to return for this request
+        """
+        self._remember(key, dict(result))
+        if self.path:
+            with self._db.connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, result, created_at)"
+                    " VALUES (?, ?, ?)",
+                    (key, json.dumps(result, ensure_ascii=False), time.time()),
+                )
+
+    def _remember(self, key: str, result: Dict):
+        """Insert into the memory tier, evicting the least recently used."""
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every stored result."""
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._db.connect() as conn:
+                conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        """Number of results in the memory tier."""
+        with self._lock:
+            return len(self._entries)
+
+
+# Singleton instance
+_cache_instance = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Get or create the shared response cache (None when disabled in config)."""
+    global _cache_instance
+    if _cache_instance is None and RESPONSE_CACHE_SIZE > 0:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = ResponseCache(
+                    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_PATH)
+    return _cache_instance
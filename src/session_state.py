@@ -0,0 +1,159 @@
+"""
+Per-session conversation state.
+A compact object holding everything that differs between users, so that the
+heavy pipeline (model provider, moderator) can be shared by all sessions.
+"""
+
+import time
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+
+from .config import CONTEXT_WINDOW_SIZE, ESCALATION_WINDOW_TURNS
+
+
+class EscalationTracker:
+    """
+    Running count of crisis keyword hits over the last user turns.
+
+    Per-turn hit counts sit in a ring buffer next to their sum, so recording
+    a turn and reading the window total are both O(1) and no history has to
+    be rescanned.
+    """
+
+    __slots__ = ("counts", "total", "_undoable", "_dropped")
+
+    def __init__(self, window: int = ESCALATION_WINDOW_TURNS):
+        """
+        Create an empty tracker.
+
+        Args:
+            window: Number of user turns kept in the sum
+        """
+        self.counts: Deque[int] = deque(maxlen=window)
+        self.total = 0
+        # Whether the last record() can be undone, and the count it evicted
+        self._undoable = False
+        self._dropped: Optional[int] = None
+
+    def record(self, hits: int):
+        """
+        Add the hit count of a new user turn, dropping the oldest if full.
+
+        Args:
+            hits: Crisis keywords found in the turn
+        """
+        self._undoable = True
+        self._dropped = None
+        if len(self.counts) == self.counts.maxlen:
+            self._dropped = self.counts[0]
+            self.total -= self._dropped
+        self.counts.append(hits)
+        self.total += hits
+
+    def undo(self):
+        """Forget the turn added by the last record(), e.g. a rejected request."""
+        if not self._undoable:
+            return
+        self._undoable = False
+        self.total -= self.counts.pop()
+        if self._dropped is not None:
+            self.counts.appendleft(self._dropped)
+            self.total += self._dropped
+
+    def extend(self, counts: List[int]):
+        """Record several turns, oldest first."""
+        for hits in counts:
+            self.record(hits)
+
+
+class SessionState:
+    """Conversation state for one user session."""
+
+    __slots__ = (
+        "session_id",
+        "history",
+        "turn_count",
+        "first_interaction",
+        "model_context",
+        "context_span",
+        "escalation",
+    )
+
+    # Each turn has 2 messages; older messages fall out of the ring buffer
+    MAX_HISTORY_SIZE = CONTEXT_WINDOW_SIZE * 2
+
+    def __init__(self, session_id: Optional[str] = None):
+        """
+        Create an empty session.
+
+        Args:
+            session_id: Identifier to report in results; generated if omitted
+        """
+        self.session_id = session_id or f"session_{int(time.time())}"
+        self.history: Deque[Dict] = deque(maxlen=self.MAX_HISTORY_SIZE)
+        self.turn_count = 0  # number of user->assistant turns completed
+        self.first_interaction = True
+        # Ollama token context from the last generation, reused on follow-ups
+        # while it still matches the recorded history
+        self.model_context: Optional[List[int]] = None
+        # Trailing history messages the next prompt shows the model (those
+        # model_context covers, or those a rebuilt prompt sends)
+        self.context_span = 0
+        # Crisis hits of recent user turns; outlives history trimming
+        self.escalation = EscalationTracker()
+
+    def recent(self, count: int) -> List[Dict]:
+        """
+        Return the last ``count`` history messages, oldest first.
+
+        Args:
+            count: Number of messages wanted
+
+        Returns:
+            List of message dicts (may be shorter than count)
+        """
+        start = max(len(self.history) - count, 0)
+        return list(islice(self.history, start, None))
+
+    def reset(self, session_id: Optional[str] = None):
+        """Clear the conversation and start a new session id."""
+        self.__init__(session_id)
+
+    def to_dict(self) -> Dict:
+        """
+        Export the state as JSON-compatible data.
+
+        The model's token context (thousands of ints) is left out; a restored
+        state rebuilds the prompt from the same ``context_span`` messages.
+
+        Returns:
+            Dict that from_dict() turns back into an equivalent state
+        """
+        return {
+            "session_id": self.session_id,
+            "conversation_history": list(self.history),
+            "turn_count": self.turn_count,
+            "first_interaction": self.first_interaction,
+            "context_span": self.context_span,
+            "escalation": list(self.escalation.counts),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SessionState":
+        """
+        Rebuild a state from data produced by to_dict().
+
+        Args:
+            data: Exported session state
+
+        Returns:
+            SessionState continuing that conversation
+        """
+        state = cls(data["session_id"])
+        state.history.extend(data["conversation_history"])
+        state.turn_count = data["turn_count"]
+        state.first_interaction = data["first_interaction"]
+        state.context_span = data.get("context_span", 0)
+        state.escalation.extend(data.get("escalation", []))
+        return state
@@ -0,0 +1,226 @@
+"""
+Session store module for per-user conversation state.
+Keeps sessions bounded in memory (LRU with idle expiry) or in a SQLite file
+that survives restarts and is shared by several workers.
+"""
+
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .config import (
+    SESSION_IDLE_TTL_SECONDS,
+    SESSION_STORE_BACKEND,
+    SESSION_STORE_MAX_SIZE,
+    SESSION_STORE_PATH,
+)
+from .session_state import SessionState
+from .sqlite_utils import SQLiteConnections
+
+logger = logging.getLogger(__name__)
+
+
+class SessionStore(ABC):
+    """
+    Interface for session stores.
+
+    Callers ``get`` a session at the start of a request and ``put`` it back
+    once the turn has been processed so persistent backends see the update.
+    """
+
+    def __init__(
+        self,
+        max_size: int = SESSION_STORE_MAX_SIZE,
+        ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+    ):
+        """
+        Initialize store limits.
+
+        Args:
+            max_size: Maximum number of sessions kept
+            ttl_seconds: Idle time after which a session expires
+        """
+        if max_size < 1:
+            raise ValueError(f"Invalid max_size: {max_size}")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionState]:
+        """Return the state of a session, or None if unknown or expired."""
+
+    @abstractmethod
+    def put(self, session_id: str, state: SessionState):
+        """Store or refresh the state of a session."""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Forget a session."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of live sessions."""
+
+
+class MemorySessionStore(SessionStore):
+    """In-process store with LRU eviction and idle expiry."""
+
+    def __init__(
+        self,
+        max_size: int = SESSION_STORE_MAX_SIZE,
+        ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+    ):
+        super().__init__(max_size, ttl_seconds)
+        # session_id -> (state, last access); ordered least recent first
+        self._entries: "OrderedDict[str, Tuple[SessionState, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        """Drop idle sessions; the oldest entries are always at the front."""
+        cutoff = now - self.ttl_seconds
+        while self._entries:
+            session_id, (_, last_access) = next(iter(self._entries.items()))
+            if last_access > cutoff:
+                break
+            self._entries.popitem(last=False)
+            logger.info("Session %s expired", session_id)
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries[session_id] = (entry[0], now)
+            self._entries.move_to_end(session_id)
+            return entry[0]
+
+    def put(self, session_id: str, state: SessionState):
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            self._entries[session_id] = (state, now)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.info("Session %s evicted (store full)", evicted)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.time())
+            return len(self._entries)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite-backed store shared by every process that opens the same file.
+
+    States are serialized with SessionState.to_dict(), so each ``get``
+    returns a fresh copy; remember to ``put`` it back after the turn.
+    """
+
+    def __init__(
+        self,
+        path: str = SESSION_STORE_PATH,
+        max_size: int = SESSION_STORE_MAX_SIZE,
+        ttl_seconds: float = SESSION_IDLE_TTL_SECONDS,
+    ):
+        """
+        Open (and create if needed) the session database.
+
+        Args:
+            path: SQLite database file
+            max_size: Maximum number of sessions kept
+            ttl_seconds: Idle time after which a session expires
+        """
+        super().__init__(max_size, ttl_seconds)
+        self.path = path
+        self._db = SQLiteConnections(path)
+        with self._db.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " session_id TEXT PRIMARY KEY,"
+                " state TEXT NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_last_access"
+                " ON sessions (last_access)"
+            )
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        now = time.time()
+        with self._db.connect() as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions"
+                " WHERE session_id = ? AND last_access > ?",
+                (session_id, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?",
+                (now, session_id),
+            )
+        return SessionState.from_dict(json.loads(row[0]))
+
+    def put(self, session_id: str, state: SessionState):
+        now = time.time()
+        payload = json.dumps(state.to_dict(), ensure_ascii=False)
+        with self._db.connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, state, last_access)"
+                " VALUES (?, ?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET"
+                " state = excluded.state, last_access = excluded.last_access",
+                (session_id, payload, now),
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE last_access <= ?",
+                (now - self.ttl_seconds,),
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                " SELECT session_id FROM sessions"
+                " ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_size,),
+            )
+
+    def delete(self, session_id: str):
+        with self._db.connect() as conn:
+            conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def __len__(self) -> int:
+        row = self._db.connect().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_access > ?",
+            (time.time() - self.ttl_seconds,),
+        ).fetchone()
+        return row[0]
+
+
+def create_session_store(backend: str = SESSION_STORE_BACKEND) -> SessionStore:
+    """
+    Create the session store selected in config.
+
+    Args:
+        backend: "memory" or "sqlite"
+
+    Returns:
+        SessionStore instance
+    """
+    if backend == "sqlite":
+        logger.info("Using SQLite session store at %s", SESSION_STORE_PATH)
+        return SQLiteSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
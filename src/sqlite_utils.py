@@ -0,0 +1,48 @@
+"""
+SQLite helpers shared by the persistent stores.
+sqlite3 connections may only be used by the thread that opened them, and a
+connection inherited through fork must not be touched in the child, so each
+thread of each process opens its own.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class SQLiteConnections:
+    """
+    Per-thread, per-process connections to one SQLite file in WAL mode.
+
+    Usage:
+        db = SQLiteConnections(path)
+        with db.connect() as conn:
+            conn.execute(...)
+    """
+
+    def __init__(self, path: str, timeout: float = 30):
+        """
+        Prepare connections to ``path``, creating its directory if needed.
+
+        Args:
+            path: SQLite database file
+            timeout: Seconds to wait for a lock held by another connection
+        """
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def connect(self) -> sqlite3.Connection:
+        """Return the calling thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        # A connection inherited through fork (e.g. from a preloading server
+        # master) must not be used, or closed, in the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            # WAL lets readers in other processes proceed while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
@@ -0,0 +1,123 @@
+"""
+Tests for how ChatPipeline sends conversation history to the model.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.chat_engine import ChatPipeline
+from src.config import CONTEXT_WINDOW_SIZE
+from src.model_provider import ModelUnavailable, SchedulerBusy
+from src.session_state import SessionState
+
+
+class RecordingModel:
+    """Stand-in provider that records each request and returns a context."""
+
+    model_name = "stub"
+
+    def __init__(self):
+        self.requests = []
+
+    def generate(self, prompt, system_prompt=None, conversation_history=None,
+                 context=None, session_id=None, **kwargs):
+        self.requests.append({
+            "context": context,
+            "history": conversation_history,
+        })
+        return {
+            "response": "Thank you for telling me. How are you feeling now?",
+            "model": self.model_name,
+            "context": list(range(len(self.requests) * 10)),
+            "deterministic": True,
+        }
+
+
+def test_context_is_reused_again_after_the_window_slides():
+    model = RecordingModel()
+    pipeline = ChatPipeline(model=model)
+    state = SessionState()
+
+    for day in range(CONTEXT_WINDOW_SIZE * 3):
+        pipeline.process_message(state, f"I have been feeling low, day {day}")
+
+    rebuilt = [
+        index for index, request in enumerate(model.requests)
+        if request["context"] is None
+    ]
+    # The first turn and at least one slide of the history window rebuild
+    # the prompt from text ...
+    assert rebuilt[0] == 0
+    assert len(rebuilt) >= 2
+    # ... and the turn after every rebuild continues from its context
+    for index in rebuilt:
+        if index + 1 < len(model.requests):
+            assert model.requests[index + 1]["context"] is not None
+
+
+def test_rebuilt_prompt_sends_the_window_the_context_covered():
+    model = RecordingModel()
+    pipeline = ChatPipeline(model=model)
+    state = SessionState()
+
+    for day in range(3):
+        pipeline.process_message(state, f"I have been feeling low, day {day}")
+    covered = state.context_span
+
+    # Losing the token context (e.g. a fallback reply) must not change the
+    # history the model is shown
+    state.model_context = None
+    pipeline.process_message(state, "Work has been stressful too")
+
+    assert len(model.requests[-1]["history"]) == covered
+
+
+class RejectingModel:
+    """Stand-in provider that never takes a request."""
+
+    model_name = "stub"
+
+    def __init__(self, error):
+        self.error = error
+
+    def generate(self, *args, **kwargs):
+        raise self.error
+
+
+@pytest.mark.parametrize("error, tag", [
+    (SchedulerBusy("Generation queue is full"), "busy"),
+    (ModelUnavailable("Cannot reach Ollama"), "model_unavailable"),
+])
+def test_rejected_requests_leave_the_session_untouched(error, tag):
+    pipeline = ChatPipeline(model=RejectingModel(error))
+    state = SessionState()
+
+    result = pipeline.process_message(state, "I have been feeling low lately")
+
+    assert result["safety_action"] == "error"
+    assert result["policy_tags"] == [tag]
+    assert not state.history
+    assert state.turn_count == 0
+    assert state.first_interaction
+
+
+def test_stored_state_rebuilds_the_prompt_without_the_context():
+    model = RecordingModel()
+    pipeline = ChatPipeline(model=model)
+    state = SessionState()
+
+    for day in range(3):
+        pipeline.process_message(state, f"I have been feeling low, day {day}")
+    covered = state.context_span
+
+    restored = SessionState.from_dict(state.to_dict())
+    pipeline.process_message(restored, "Work has been stressful too")
+
+    assert "model_context" not in state.to_dict()
+    assert model.requests[-1]["context"] is None
+    assert len(model.requests[-1]["history"]) == covered
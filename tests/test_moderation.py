@@ -0,0 +1,43 @@
+"""
+Tests for typo-tolerant keyword matching in the moderator.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add src to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.moderation import ModerationAction, get_moderator
+
+
+@pytest.fixture(scope="module")
+def moderator():
+    return get_moderator()
+
+
+@pytest.mark.parametrize("message, category, term", [
+    ("I keep thinking about siucide", "crisis", "suicide"),
+    ("I have been feeling suicdal lately", "crisis", "suicidal"),
+    ("Can I get a perscription for this?", "medical", "prescription"),
+    ("Is xannax safe to take?", "medical", "xanax"),
+    ("Should I change my medicaton?", "medical", "medication"),
+])
+def test_typos_of_terms_are_matched(moderator, message, category, term):
+    result = moderator.moderate(message)
+    assert result.action != ModerationAction.ALLOW
+    assert category in result.tags
+    assert term in result.reason
+
+
+@pytest.mark.parametrize("message", [
+    "My partner and I are trying mediation to resolve our conflict",
+    "I admire my mom's dedication to her job",
+    "My job feels so prosaic these days",
+    "Meditation helps me calm down",
+])
+def test_real_words_near_terms_are_allowed(moderator, message):
+    result = moderator.moderate(message)
+    assert result.action == ModerationAction.ALLOW, result.reason